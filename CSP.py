@@ -1,13 +1,25 @@
 import random
-from typing import Set, Dict, List, TypeVar, Optional
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from typing import Set, Dict, List, Tuple, TypeVar, Optional, Iterable, Iterator, Callable, Hashable, Mapping
 from abc import ABC, abstractmethod
-from util import monitor
+from assignment import Assignment, AssignmentView, assignedIds
+from dlx import exactCovers
+from domains import BitDomains, bitList
+from restarts import RestartPolicy, makeRestartPolicy
+from search import BacktrackingSearch
+from heuristics import VariableOrder, ValueOrder, MinimumRemainingValues, LeastConstrainingValue, VARIABLE_ORDERS, VALUE_ORDERS
+from stats import SearchStats, SOLVED, UNSATISFIABLE, TIMEOUT, STOPPED, UNKNOWN
 
 
 Value = TypeVar('Value')
 
 
 class Variable(ABC):
+    __slots__ = ()
+
     @property
     @abstractmethod
     def startDomain(self) -> Set[Value]:
@@ -15,8 +27,140 @@ class Variable(ABC):
         pass
 
 
+class ConstraintGraph:
+    """ Compiled constraint graph of a CSP.
+        Every variable is mapped to a dense integer id and its neighbors are precomputed once,
+        both as id tuples and as variable tuples, so the solvers never rebuild neighbor sets.
+        Values get dense ids as well, so domains can be stored as bitmasks (see `BitDomains`).
+        If the CSP gives every constraint a key (see `CSP::constraintKey`), the constraints are compiled into
+        compatibility tables: supports[i][j][k] is the mask of the values of variable j that are compatible with
+        value k of variable i. Constraints with the same key share one table, which is built with
+        `CSP::isValidPairwise` once; without keys supports is None.
+    """
+    __slots__ = ('variables', 'index', 'neighbors', 'neighborVars', 'values', 'valueIndex', 'startMasks', 'supports')
+
+    def __init__(self, csp: 'CSP', variables: Optional[Iterable[Variable]] = None):
+        self.variables: List[Variable] = list(csp.variables if variables is None else variables)
+        self.index: Dict[Variable, int] = {var: i for i, var in enumerate(self.variables)}
+        self.neighbors: List[Tuple[int, ...]] = [tuple(self.index[neighbor] for neighbor in csp.neighbors(var))
+                                                 for var in self.variables]
+        self.neighborVars: List[Tuple[Variable, ...]] = [tuple(self.variables[j] for j in ids)
+                                                         for ids in self.neighbors]
+
+        startDomains = [var.startDomain for var in self.variables]
+        values = set().union(*startDomains)
+        try:
+            self.values: List[Value] = sorted(values)
+        except TypeError:
+            self.values = list(values)
+        self.valueIndex: Dict[Value, int] = {val: k for k, val in enumerate(self.values)}
+        self.startMasks: List[int] = [sum(1 << self.valueIndex[val] for val in domain) for domain in startDomains]
+        self.supports: Optional[List[Dict[int, Tuple[int, ...]]]] = self._compileTables(csp)
+
+    def __len__(self) -> int:
+        return len(self.variables)
+
+    def _compileTables(self, csp: 'CSP') -> Optional[List[Dict[int, Tuple[int, ...]]]]:
+        """ Returns the compatibility tables of the constraints of csp, or None if one of them has no key. """
+        tables: Dict[Hashable, Tuple[int, ...]] = dict()
+        supports = []
+        values = self.values
+        for i, var in enumerate(self.variables):
+            row = dict()
+            for j, neighbor in zip(self.neighbors[i], self.neighborVars[i]):
+                key = csp.constraintKey(var, neighbor)
+                if key is None:
+                    return None
+                table = tables.get(key)
+                if table is None:
+                    table = tables[key] = tuple(
+                        sum(1 << w for w, other in enumerate(values) if csp.isValidPairwise(var, value, neighbor, other))
+                        for value in values)
+                row[j] = table
+            supports.append(row)
+        return supports
+
+
+class ConsistencyChecker:
+    """ Checks whether a single new assignment is consistent with the current assignment.
+        The search calls `assign`/`unassign` as it extends and retracts the assignment, so
+        subclasses can keep occupancy counters instead of looking at the neighbors.
+        This default implementation checks var against its assigned neighbors in the compiled graph, reading the
+        value ids of an `Assignment` directly.
+    """
+    def __init__(self, csp: 'CSP', assignment: Dict[Variable, Value]):
+        self.csp = csp
+        self.graph = csp.graph
+        self.assignment = assignment
+        self.ids = assignment.ids if isinstance(assignment, AssignmentView) and assignment.graph is self.graph else None
+
+    def isConsistent(self, var: Variable, value: Value) -> bool:
+        """ Return whether assigning value to var violates no constraint with an assigned neighbor. """
+        assignment, isValidPairwise, graph = self.assignment, self.csp.isValidPairwise, self.graph
+        if graph.supports is not None:
+            i, k, valueIndex, ids = graph.index[var], graph.valueIndex[value], graph.valueIndex, self.ids
+            for j, table in graph.supports[i].items():
+                if ids is not None:
+                    w = ids[j]
+                    if w >= 0 and not table[k] >> w & 1:
+                        return False
+                    continue
+                neighbor_value = assignment.get(graph.variables[j])
+                if neighbor_value is not None and not table[k] >> valueIndex[neighbor_value] & 1:
+                    return False
+            return True
+        for neighbor in graph.neighborVars[graph.index[var]]:
+            neighbor_value = assignment.get(neighbor)
+            if neighbor_value is not None and not isValidPairwise(var, value, neighbor, neighbor_value):
+                return False
+        return True
+
+    def assign(self, var: Variable, value: Value):
+        """ Called after var was assigned value. """
+        pass
+
+    def unassign(self, var: Variable, value: Value):
+        """ Called after the assignment of value to var was retracted. """
+        pass
+
+
 class CSP(ABC):
-    counter = 0
+    stats: Optional[SearchStats] = None                     # statistics of the current (or last) solve
+    stopCondition: Optional[Callable[[], bool]] = None     # when set and true, the search gives up
+    rng: Optional[random.Random] = None                     # when set, breaks the ties of the heuristics at random
+    variableOrder: VariableOrder = MinimumRemainingValues()
+    valueOrder: ValueOrder = LeastConstrainingValue()
+
+    def __getstate__(self):
+        """ Pickles this CSP without the statistics and stop condition of the solve running in this process. """
+        state = dict(self.__dict__)
+        state.pop('stats', None)
+        state.pop('stopCondition', None)
+        return state
+
+    @property
+    def graph(self) -> ConstraintGraph:
+        """ Return the compiled constraint graph of this CSP, building it on first use.
+            `CSP::variables` and `CSP::neighbors` are only called while building it.
+        """
+        graph = self.__dict__.get('_graph')
+        if graph is None:
+            graph = self._graph = ConstraintGraph(self)
+        return graph
+
+    def compileGraph(self, seed: Optional[int] = None) -> ConstraintGraph:
+        """ Rebuilds the constraint graph of this CSP.
+            Without a seed the variables keep the iteration order of `CSP::variables`, which for sets of
+            objects differs from run to run. With a seed they are put in a random order determined by the seed,
+            so the ties of the variable and value orders are broken the same way in every run.
+        """
+        variables = list(self.variables)
+        if seed is not None:
+            variables.sort(key=repr)
+            random.Random(seed).shuffle(variables)
+        self._graph = ConstraintGraph(self, variables)
+        return self._graph
+
     @property
     @abstractmethod
     def variables(self) -> Set[Variable]:
@@ -27,7 +171,7 @@ class CSP(ABC):
 
     def remainingVariables(self, assignment: Dict[Variable, Value]) -> Set[Variable]:
         """ Returns the variables not yet assigned. """
-        return self.variables.difference(assignment.keys())
+        return {var for var in self.graph.variables if var not in assignment}
 
     @abstractmethod
     def neighbors(self, var: Variable) -> Set[Variable]:
@@ -47,7 +191,7 @@ class CSP(ABC):
         """ Return whether the assignment covers all variables.
             :param assignment: dict (Variable -> value)
         """
-        return len(self.variables) == len(assignment) == len(set(assignment.keys()))
+        return len(assignment) == len(self.graph)
 
     @abstractmethod
     def isValidPairwise(self, var1: Variable, val1: Value, var2: Variable, val2: Value) -> bool:
@@ -56,73 +200,301 @@ class CSP(ABC):
         """
         pass
 
+    def constraintKey(self, var1: Variable, var2: Variable) -> Optional[Hashable]:
+        """ Opt-in to compiled compatibility tables (see `ConstraintGraph`): returns a key of the constraint between
+            the neighbors var1 and var2, such that constraints with the same key allow the same pairs of values
+            (val1, val2) in `CSP::isValidPairwise`, or None to keep calling `CSP::isValidPairwise` in the search.
+            (var1, var2) is always a valid key, with a table per constraint.
+            Forward checking and arc consistency then prune with one AND of masks per neighbor or value.
+        """
+        return None
+
     def isValid(self, assignment: Dict[Variable, Value]) -> bool:
         """ Return whether the assignment is valid (i.e. is not in conflict with any constraints).
             You only need to take binary constraints into account.
             Hint: use `CSP::neighbors` and `CSP::isValidPairwise` to check that all binary constraints are satisfied.
             Note that constraints are symmetrical, so you don't need to check them in both directions.
         """
-        for var in assignment.keys():
-            for neighbor in self.neighbors(var):
-                if assignment.get(neighbor) is None:
+        graph = self.graph
+        supports, valueIndex = graph.supports, graph.valueIndex
+        for var, value in assignment.items():
+            i = graph.index[var]
+            for j in graph.neighbors[i]:
+                if j < i: continue
+                neighbor = graph.variables[j]
+                neighbor_value = assignment.get(neighbor)
+                if neighbor_value is None:
                     continue
-                elif not self.isValidPairwise(var, assignment[var], neighbor, assignment[neighbor]):
+                elif supports is not None:
+                    if not supports[i][j][valueIndex[value]] >> valueIndex[neighbor_value] & 1:
+                        return False
+                elif not self.isValidPairwise(var, value, neighbor, neighbor_value):
                     return False
         return True
 
     def _findUnassignedValue(self, assignment: Dict[Variable, Value]) -> Variable:
-        for var in self.variables:
-            if assignment.get(var) == None:
+        for var in self.graph.variables:
+            if assignment.get(var) is None:
                 return var
 
-    def solveBruteForce(self, initialAssignment: Dict[Variable, Value] = dict()) -> Optional[Dict[Variable, Value]]:
+    def useStrategies(self, variableOrder: Optional[str] = None, valueOrder: Optional[str] = None,
+                      rng: Optional[random.Random] = None):
+        """ Selects the strategies of `CSP::selectVariable` and `CSP::orderDomain` by name
+            (see `heuristics.VARIABLE_ORDERS` and `heuristics.VALUE_ORDERS`). None keeps the current one.
+            rng becomes `CSP::rng`, which breaks ties at random; without it ties are broken deterministically.
+        """
+        self.rng = rng
+        if variableOrder is not None:
+            if variableOrder not in VARIABLE_ORDERS:
+                raise ValueError(f"Unknown variable order '{variableOrder}'.")
+            self.variableOrder = VARIABLE_ORDERS[variableOrder]()
+        if valueOrder is not None:
+            if valueOrder not in VALUE_ORDERS:
+                raise ValueError(f"Unknown value order '{valueOrder}'.")
+            self.valueOrder = VALUE_ORDERS[valueOrder]()
+        self.variableOrder.reset()
+
+    def _randomize(self, variableOrder: Optional[str], valueOrder: Optional[str], seed: Optional[int],
+                   restartPolicy: Optional[str], restartUnit: int) -> Optional[RestartPolicy]:
+        """ Selects the strategies of a solve, with random tie-breaking if it has a seed or restarts (which need
+            it to search differently every run), and returns its restart policy.
+        """
+        restarts = makeRestartPolicy(restartPolicy, restartUnit)
+        rng = random.Random(seed) if seed is not None or restarts is not None else None
+        self.useStrategies(variableOrder, valueOrder, rng)
+        return restarts
+
+    def checkInitialAssignment(self, initialAssignment: Dict[Variable, Value]):
+        """ Raises ValueError if the systematic solvers (bf, fc, ac3 and dlx) cannot search from initialAssignment.
+            Override for CSPs that restrict their search in a way an initial assignment can break.
+        """
+        pass
+
+    def consistencyChecker(self, assignment: Dict[Variable, Value]) -> ConsistencyChecker:
+        """ Returns the incremental consistency checker used by the search, for the given current assignment.
+            Override to return a problem specific `ConsistencyChecker`.
+        """
+        return ConsistencyChecker(self, assignment)
+
+    def solve(self, method: str, initialAssignment: Dict[Variable, Value] = dict(), **options) -> SearchStats:
+        """ Solves this CSP with the given method: "bf", "fc", "ac3", "minconflicts" or "dlx".
+            The options are passed on to `CSP::solveBruteForce`, `CSP::solveForwardChecking`, `CSP::solveAC3`,
+            `CSP::solveMinConflicts` or `CSP::solveDLX`.
+        """
+        if method == "bf":
+            return self.solveBruteForce(initialAssignment, **options)
+        elif method == "fc":
+            return self.solveForwardChecking(initialAssignment, **options)
+        elif method == "ac3":
+            return self.solveAC3(initialAssignment, **options)
+        elif method == "minconflicts":
+            return self.solveMinConflicts(initialAssignment, **options)
+        elif method == "dlx":
+            return self.solveDLX(initialAssignment, **options)
+        raise ValueError(f"Method '{method}' not found.")
+
+    def solveParallel(self, method: str = "fc", initialAssignment: Dict[Variable, Value] = dict(), jobs: Optional[int] = None,
+                      subproblems: Optional[int] = None, **options) -> SearchStats:
+        """ Solves this CSP with a pool of jobs processes, see `parallel.solveParallel`. """
+        from parallel import solveParallel
+        return solveParallel(self, method, initialAssignment, jobs, subproblems, **options)
+
+    def _search(self, method: str, assignment: Dict[Variable, Value], domains, arcConsistency: Optional[Callable] = None,
+                stats: Optional[SearchStats] = None) -> SearchStats:
+        """ Runs the backtracking search of method on already propagated domains. """
+        stats = self.startStats(stats)
+        assignment = Assignment(self.graph, assignment)
+        with stats.measure(len(assignment)):
+            stats.solution = BacktrackingSearch(self, method, assignment, domains, arcConsistency, None, stats)._run()
+        return stats
+
+    def startStats(self, stats: Optional[SearchStats] = None) -> SearchStats:
+        """ Makes stats (or new default stats) the statistics of the solve that is starting. """
+        self.stats = stats if stats is not None else SearchStats()
+        return self.stats
+
+    @contextmanager
+    def budget(self, stats: SearchStats, maxNodes: Optional[int] = None, timeout: Optional[float] = None,
+               complete: bool = True):
+        """ Runs the solve in the with block within a budget of maxNodes search nodes and timeout seconds (if given),
+            by wrapping `CSP::stopCondition` for the duration of the block. The search stops at the first node
+            past the budget, so the counters of stats are those of the work done until then.
+            At the end, `SearchStats::status` is set from the solution in stats: SOLVED, TIMEOUT when the budget
+            was used up, STOPPED when the stop condition was set, and otherwise UNSATISFIABLE, or UNKNOWN if the
+            solve is not complete (local search).
+        """
+        stopCondition = self.stopCondition
+        stopped = None
+        if maxNodes is not None or timeout is not None or stopCondition is not None:
+            limit = stats.nodes + maxNodes if maxNodes is not None else None
+            deadline = time.perf_counter() + timeout if timeout is not None else None
+
+            def budgetCondition() -> bool:
+                nonlocal stopped
+                if limit is not None and stats.nodes >= limit or deadline is not None and time.perf_counter() >= deadline:
+                    stopped = TIMEOUT
+                elif stopCondition is not None and stopCondition():
+                    stopped = STOPPED
+                return stopped is not None
+            self.stopCondition = budgetCondition
+        try:
+            yield
+        finally:
+            self.stopCondition = stopCondition
+        if stats.solution is not None: stats.status = SOLVED
+        else: stats.status = stopped or (UNSATISFIABLE if complete else UNKNOWN)
+
+    def iterSolutions(self, method: str = "fc", initialAssignment: Dict[Variable, Value] = dict(),
+                      **options) -> Iterator[Mapping[Variable, Value]]:
+        """ Lazily yields every solution that extends initialAssignment, searching with method ("bf", "fc" or "ac3"),
+            with the options of `CSP::search`, or with "dlx", which only takes the stats option.
+            The search only continues when the next solution is asked for; the statistics of the search are in
+            `CSP::stats` (or the stats option).
+            Solutions found by the search are passed through `CSP::expandSolution`, so symmetric solutions that
+            symmetry breaking cut from the search are yielded as well.
+            Every solution is a new mapping from variables to values: a read-only `assignment.AssignmentView`
+            snapshot of the assignment of a bf, fc or ac3 search, and a dict for dlx or when `CSP::expandSolution`
+            builds the solutions (N Queens with symmetry breaking).
+        """
+        for solution in self._enumerateSolutions(method, initialAssignment, **options):
+            for expanded in self.expandSolution(solution):
+                yield expanded.copy()
+
+    def countSolutions(self, method: str = "fc", initialAssignment: Dict[Variable, Value] = dict(), **options) -> int:
+        """ Returns the number of solutions that extend initialAssignment, see `CSP::iterSolutions` for the options.
+            The solutions are counted on the live assignment of the search, without copying them, and symmetric
+            solutions are counted through `CSP::solutionWeight`.
+        """
+        count = 0
+        for solution in self._enumerateSolutions(method, initialAssignment, **options):
+            count += self.solutionWeight(solution)
+        return count
+
+    def expandSolution(self, assignment: Dict[Variable, Value]) -> Iterator[Dict[Variable, Value]]:
+        """ Yields the solutions represented by a solution of the search: just assignment itself, unless the
+            CSP breaks symmetries, in which case it yields the solutions symmetric to assignment (or nothing,
+            when they are represented by another solution of the search).
+        """
+        yield assignment
+
+    def solutionWeight(self, assignment: Dict[Variable, Value]) -> int:
+        """ Returns the number of solutions `CSP::expandSolution` yields for assignment. """
+        return 1
+
+    def _enumerateSolutions(self, method: str, initialAssignment: Dict[Variable, Value], **options) -> Iterator[Dict[Variable, Value]]:
+        """ Runs the search of `CSP::search` to the end, yielding the live assignment at every solution. """
+        if method == "dlx":
+            self.checkInitialAssignment(initialAssignment)
+            stats = self.startStats(options.pop("stats", None))
+            if options:
+                raise TypeError(f"Unexpected options for dlx: {', '.join(options)}")
+            with stats.measure(len(initialAssignment)):
+                yield from self._exactCovers(initialAssignment)
+            return
+        search = self.search(method, initialAssignment, **options)
+        with search.stats.measure(len(initialAssignment)):
+            solution = search._run()
+            while solution is not None:
+                yield solution
+                solution = search._run()
+
+    def search(self, method: str = "fc", initialAssignment: Dict[Variable, Value] = dict(), bitset: bool = False,
+               trail: bool = True, propagation: str = "ac3", variableOrder: Optional[str] = None,
+               valueOrder: Optional[str] = None, stats: Optional[SearchStats] = None, backjumping: bool = False,
+               nogoods: int = 0) -> BacktrackingSearch:
+        """ Initializes the domains like the `CSP::solve*` methods and returns the (not yet started) search of method
+            ("bf", "fc" or "ac3"), which can be run with a node budget, paused and resumed, see `BacktrackingSearch`.
+            The search of an initial assignment that is not valid is exhausted without expanding a node.
+        """
+        if method not in ("bf", "fc", "ac3"):
+            raise ValueError(f"Method '{method}' cannot be searched step by step.")
+        self.checkInitialAssignment(initialAssignment)
+        arcConsistency = self.arcConsistency(propagation) if method == "ac3" else None
+        stats = self.startStats(stats)
+        with stats.measure(len(initialAssignment)):
+            self.useStrategies(variableOrder, valueOrder)
+            domains = None                  # an inconsistent initial assignment leaves no node to expand
+            if self.isValid(initialAssignment):
+                domains = self.initialDomains(initialAssignment, bitset, trail)
+                if method != "bf":
+                    domains = self.forwardChecking(initialAssignment, domains)
+                if method == "ac3":
+                    domains = arcConsistency(initialAssignment, domains)
+        return BacktrackingSearch(self, method, Assignment(self.graph, initialAssignment), domains, arcConsistency, None, stats, backjumping,
+                                  nogoods)
+
+    def initialDomains(self, assignment: Dict[Variable, Value], bitset: bool = False, trail: bool = True):
+        """ Returns the initial domains for assignment.
+            If bitset is set, this is a `BitDomains` store, which is trailing unless trail is unset.
+        """
+        if bitset:
+            return BitDomains.fromAssignment(self.graph, assignment, trail)
+        return domainsFromAssignment(assignment, self.graph.variables)
+
+    def solveBruteForce(self, initialAssignment: Dict[Variable, Value] = dict(), bitset: bool = False, trail: bool = True,
+                        variableOrder: Optional[str] = None, valueOrder: Optional[str] = None,
+                        stats: Optional[SearchStats] = None, backjumping: bool = False, nogoods: int = 0,
+                        maxNodes: Optional[int] = None, timeout: Optional[float] = None, seed: Optional[int] = None,
+                        restartPolicy: Optional[str] = None, restartUnit: int = 100) -> SearchStats:
         """ Called to solve this CSP with brute force technique.
-            Initializes the domains and calls `CSP::_solveBruteForce`. """
-        domains = domainsFromAssignment(initialAssignment, self.variables)
-        return self._solveBruteForce(initialAssignment, domains)
-
-    @monitor
-    def _solveBruteForce(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]]) -> Optional[Dict[Variable, Value]]:
-        """ Implement the actual backtracking algorithm to brute force this CSP.
-            Use `CSP::isComplete`, `CSP::isValid`, `CSP::selectVariable` and `CSP::orderDomain`.
+            Initializes the domains and calls `CSP::_solveBruteForce`, unless the initial assignment is not valid
+            (see `CSP::isValid`), which makes the CSP unsatisfiable.
+            backjumping and nogoods (the capacity of the nogood store) are explained in `search.BacktrackingSearch`.
+            maxNodes and timeout (in seconds) bound the search, see `CSP::budget`.
+            With a seed or a restartPolicy ("luby" or "geometric", with cutoffs in multiples of restartUnit nodes,
+            see `restarts`), ties of the heuristics are broken at random, reproducibly for a given seed.
+            :return: the statistics of the search, with the solution (or None) in `SearchStats::solution`
+                and the outcome in `SearchStats::status`. """
+        self.checkInitialAssignment(initialAssignment)
+        stats = self.startStats(stats)
+        with stats.measure(len(initialAssignment)), self.budget(stats, maxNodes, timeout):
+            restarts = self._randomize(variableOrder, valueOrder, seed, restartPolicy, restartUnit)
+            if self.isValid(initialAssignment):
+                domains = self.initialDomains(initialAssignment, bitset, trail)
+                assignment = Assignment(self.graph, initialAssignment)
+                stats.solution = self._solveBruteForce(assignment, domains, self.consistencyChecker(assignment),
+                                                       backjumping, nogoods, restarts)
+        return stats
+
+    def _solveBruteForce(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]], checker: Optional[ConsistencyChecker] = None,
+                         backjumping: bool = False, nogoods: int = 0,
+                         restarts: Optional[RestartPolicy] = None) -> Optional[Dict[Variable, Value]]:
+        """ The backtracking search to brute force this CSP, on the explicit stack of `BacktrackingSearch`.
+            Uses `CSP::isComplete`, `CSP::selectVariable`, `CSP::orderDomain` and a `ConsistencyChecker`.
             :return: a complete and valid assignment if one exists, None otherwise.
         """
-        self.counter += 1
-        if self.isComplete(assignment): return assignment
-        var = self.selectVariable(assignment, domains)
-        for value in self.orderDomain(assignment, domains, var):
-            test_assignment = dict(assignment)
-            test_assignment[var] = value
-            if self.isValid(test_assignment):
-                assignment[var] = value
-                result = self._solveBruteForce(assignment, domains)
-                if result is not None: return result
-                assignment.pop(var)
-
-    def solveForwardChecking(self, initialAssignment: Dict[Variable, Value] = dict()) -> Optional[Dict[Variable, Value]]:
+        return BacktrackingSearch(self, "bf", assignment, domains, None, checker, None, backjumping, nogoods,
+                                  restarts)._run()
+
+    def solveForwardChecking(self, initialAssignment: Dict[Variable, Value] = dict(), bitset: bool = False, trail: bool = True,
+                        variableOrder: Optional[str] = None, valueOrder: Optional[str] = None,
+                        stats: Optional[SearchStats] = None, backjumping: bool = False, nogoods: int = 0,
+                        maxNodes: Optional[int] = None, timeout: Optional[float] = None, seed: Optional[int] = None,
+                        restartPolicy: Optional[str] = None, restartUnit: int = 100) -> SearchStats:
         """ Called to solve this CSP with forward checking.
-            Initializes the domains and calls `CSP::_solveForwardChecking`. """
-        domains = domainsFromAssignment(initialAssignment, self.variables)
-        domains = self.forwardChecking(initialAssignment, domains)
-        return self._solveForwardChecking(initialAssignment, domains)
-
-    @monitor
-    def _solveForwardChecking(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]]) -> Optional[Dict[Variable, Value]]:
-        """ Implement the actual backtracking algorithm with forward checking.
-            Use `CSP::forwardChecking` and you should no longer need to check if an assignment is valid.
+            Initializes the domains and calls `CSP::_solveForwardChecking`, see `CSP::solveBruteForce` for the options.
+            :return: the statistics of the search, with the solution (or None) in `SearchStats::solution`
+                and the outcome in `SearchStats::status`. """
+        self.checkInitialAssignment(initialAssignment)
+        stats = self.startStats(stats)
+        with stats.measure(len(initialAssignment)), self.budget(stats, maxNodes, timeout):
+            restarts = self._randomize(variableOrder, valueOrder, seed, restartPolicy, restartUnit)
+            if self.isValid(initialAssignment):
+                domains = self.initialDomains(initialAssignment, bitset, trail)
+                domains = self.forwardChecking(initialAssignment, domains)
+                assignment = Assignment(self.graph, initialAssignment)
+                stats.solution = self._solveForwardChecking(assignment, domains, self.consistencyChecker(assignment),
+                                                            backjumping, nogoods, restarts)
+        return stats
+
+    def _solveForwardChecking(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]], checker: Optional[ConsistencyChecker] = None,
+                              backjumping: bool = False, nogoods: int = 0,
+                              restarts: Optional[RestartPolicy] = None) -> Optional[Dict[Variable, Value]]:
+        """ The backtracking search with forward checking (`CSP::forwardChecking`), see `CSP::_solveBruteForce`.
             :return: a complete and valid assignment if one exists, None otherwise.
         """
-        self.counter += 1
-        if self.isComplete(assignment): return assignment
-        var = self.selectVariable(assignment, domains)
-        for var_value in self.orderDomain(assignment, domains, var):
-            test_assignment = dict(assignment)
-            test_assignment[var] = var_value
-            if self.isValid(test_assignment):
-                assignment[var] = var_value
-                result = self._solveForwardChecking(assignment, self.forwardChecking(assignment, domains, var))
-                if result is not None: return result
-                assignment.pop(var)
+        return BacktrackingSearch(self, "fc", assignment, domains, None, checker, None, backjumping, nogoods,
+                                  restarts)._run()
 
     def forwardChecking(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]], variable: Optional[Variable] = None) -> Dict[Variable, Set[Value]]:
         """ Implement the forward checking algorithm from the theory lectures.
@@ -131,110 +503,369 @@ class CSP(ABC):
         :param assignment: current assignment.
         :param variable: If not None, the variable that was just assigned (only need to check changes).
         :return: the new domains after enforcing all constraints.
+            A trailing `BitDomains` store is pruned in place and returned.
         """
-        # TODO mooiere manier vinden voor als var niet none is
+        if isinstance(domains, BitDomains):
+            return self._forwardCheckingBits(assignment, domains, variable)
+        graph = self.graph
         new_domains = dict(domains)
-        if variable is None: variables_to_check = self.variables
-        else: variables_to_check = [variable]
+        pruned = 0
+        if variable is None: variables_to_check = graph.variables
+        else: variables_to_check = (variable,)
+        supports, valueIndex = graph.supports, graph.valueIndex
+        ids = assignedIds(graph, assignment)
         for var in variables_to_check:
-            for neighbor in self.neighbors(var):
-                if assignment.get(var) is not None:
-                    valid_values = []
-                    for neighbor_value in domains.get(neighbor):
-                        if self.isValidPairwise(var, assignment.get(var), neighbor, neighbor_value):
-                            valid_values.append(neighbor_value)
-                    new_domains[neighbor] = set(valid_values)
+            i = graph.index[var]
+            k = ids[i]
+            if k < 0: continue
+            value = graph.values[k]
+            for j, neighbor in zip(graph.neighbors[i], graph.neighborVars[i]):
+                old_domain = new_domains[neighbor]
+                if supports is not None:
+                    compatible = supports[i][j][k]
+                    new_domains[neighbor] = {neighbor_value for neighbor_value in old_domain
+                                             if compatible >> valueIndex[neighbor_value] & 1}
+                else:
+                    new_domains[neighbor] = {neighbor_value for neighbor_value in old_domain
+                                             if self.isValidPairwise(var, value, neighbor, neighbor_value)}
+                pruned += len(old_domain) - len(new_domains[neighbor])
+        if self.stats is not None: self.stats.pruned += pruned
+        return new_domains
+
+    def _forwardCheckingBits(self, assignment: Dict[Variable, Value], domains: BitDomains, variable: Optional[Variable] = None) -> BitDomains:
+        """ `CSP::forwardChecking` on a `BitDomains` store. """
+        graph = self.graph
+        variables, values = graph.variables, graph.values
+        new_domains = domains.copy() if domains.trail is None else domains
+        masks, trail = new_domains.masks, new_domains.trail
+        pruned = 0
+        if variable is None: variables_to_check = variables
+        else: variables_to_check = (variable,)
+        supports = graph.supports
+        ids = assignedIds(graph, assignment)
+        for var in variables_to_check:
+            i = graph.index[var]
+            k = ids[i]
+            if k < 0: continue
+            tables = supports[i] if supports is not None else None
+            for j in graph.neighbors[i]:
+                if tables is not None:
+                    mask = masks[j] & tables[j][k]
+                else:
+                    value, neighbor = values[k], variables[j]
+                    mask = masks[j]
+                    for w in bitList(mask):
+                        if not self.isValidPairwise(var, value, neighbor, values[w]):
+                            mask ^= 1 << w
+                if mask != masks[j]:
+                    pruned += (mask ^ masks[j]).bit_count()
+                    if trail is not None: trail.append((j, masks[j]))
+                    masks[j] = mask
+        if self.stats is not None: self.stats.pruned += pruned
         return new_domains
 
     def selectVariable(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]]) -> Variable:
-        """ Implement a strategy to select the next variable to assign. """
-        # return random.choice(list(self.remainingVariables(assignment)))
-        var_to_return = None
-        smallest_domain = float("inf")
-        for var in self.variables:
-            if assignment.get(var) is not None: continue
-            if len(domains.get(var)) < smallest_domain:
-                smallest_domain, var_to_return = len(domains.get(var)), var
-        return var_to_return
+        """ Select the next variable to assign, using the `variableOrder` strategy. """
+        return self.variableOrder.select(self, assignment, domains)
 
     def orderDomain(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]], var: Variable) -> List[Value]:
-        """ Implement a smart ordering of the domain values. """
-        amount_val_removed = dict() # how many values were removed from domains for each value in the domain of var
-        org_size = 0 # how many values are currently in all the domains
-        for domain in domains.values():
-            org_size += len(domain)
-        for value in domains.get(var):
-            temp_assignment = assignment.copy()
-            temp_assignment[var] = value
-            difference = org_size
-            for domain in self.forwardChecking(temp_assignment, domains, var).values():
-                difference -= len(domain)
-            amount_val_removed[value] = difference
-
-        # sort the dictionary by values, we want the value with the lowest difference first
-        sort = sorted(amount_val_removed.items(), key=lambda x: x[1], reverse=False)
-        return [tup[0] for tup in sort]
-        # return list(domains[var])
-
-    def solveAC3(self, initialAssignment: Dict[Variable, Value] = dict()) -> Optional[Dict[Variable, Value]]:
+        """ Order the domain values of var, using the `valueOrder` strategy. """
+        return self.valueOrder.order(self, assignment, domains, var)
+
+    def solveAC3(self, initialAssignment: Dict[Variable, Value] = dict(), bitset: bool = False, trail: bool = True, propagation: str = "ac3",
+                 variableOrder: Optional[str] = None, valueOrder: Optional[str] = None,
+                 stats: Optional[SearchStats] = None, maxNodes: Optional[int] = None,
+                 timeout: Optional[float] = None, seed: Optional[int] = None, restartPolicy: Optional[str] = None,
+                 restartUnit: int = 100) -> SearchStats:
         """ Called to solve this CSP with forward checking and AC3.
-            Initializes domains and calls `CSP::_solveAC3`. """
-        domains = domainsFromAssignment(initialAssignment, self.variables)
-        return self._solveAC3(initialAssignment, self.ac3(initialAssignment, self.forwardChecking(initialAssignment, domains)))
+            propagation selects the arc consistency algorithm, see `CSP::arcConsistency`.
+            maxNodes, timeout, seed, restartPolicy and restartUnit are explained in `CSP::solveBruteForce`.
+            Initializes domains and calls `CSP::_solveAC3`.
+            :return: the statistics of the search, with the solution (or None) in `SearchStats::solution`
+                and the outcome in `SearchStats::status`. """
+        arcConsistency = self.arcConsistency(propagation)
+        self.checkInitialAssignment(initialAssignment)
+        stats = self.startStats(stats)
+        with stats.measure(len(initialAssignment)), self.budget(stats, maxNodes, timeout):
+            restarts = self._randomize(variableOrder, valueOrder, seed, restartPolicy, restartUnit)
+            if self.isValid(initialAssignment):
+                domains = self.initialDomains(initialAssignment, bitset, trail)
+                domains = arcConsistency(initialAssignment, self.forwardChecking(initialAssignment, domains))
+                assignment = Assignment(self.graph, initialAssignment)
+                stats.solution = self._solveAC3(assignment, domains, arcConsistency, self.consistencyChecker(assignment),
+                                                restarts)
+        return stats
 
-    @monitor
-    def _solveAC3(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]]) -> Optional[Dict[Variable, Value]]:
-        """
-            Implement the actual backtracking algorithm with AC3 (and FC).
-            Use `CSP::ac3`.
+    def _solveAC3(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]], arcConsistency: Optional[Callable] = None,
+                  checker: Optional[ConsistencyChecker] = None,
+                  restarts: Optional[RestartPolicy] = None) -> Optional[Dict[Variable, Value]]:
+        """ The backtracking search with forward checking and AC3 (`CSP::ac3`, or the given arcConsistency algorithm),
+            see `CSP::_solveBruteForce`.
             :return: a complete and valid assignment if one exists, None otherwise.
         """
-        self.counter += 1
-        if self.isComplete(assignment): return assignment
-        var = self.selectVariable(assignment, domains)
-        for var_value in self.orderDomain(assignment, domains, var):
-            test_assignment = dict(assignment)
-            test_assignment[var] = var_value
-            if self.isValid(test_assignment):
-                assignment[var] = var_value
-                result = self._solveAC3(assignment, self.ac3(assignment, self.forwardChecking(assignment, domains, var)))
-                if result is not None: return result
-                assignment.pop(var)
+        return BacktrackingSearch(self, "ac3", assignment, domains, arcConsistency, checker, restarts=restarts)._run()
+
+    def solveMinConflicts(self, initialAssignment: Dict[Variable, Value] = dict(), maxSteps: Optional[int] = None,
+                          restarts: int = 10, seed: Optional[int] = None, stats: Optional[SearchStats] = None,
+                          maxNodes: Optional[int] = None, timeout: Optional[float] = None) -> SearchStats:
+        """ Solves this CSP with min-conflicts local search.
+            Every try starts from a greedy assignment of all variables in random order, and then repeatedly
+            moves a random conflicted variable to the value with the fewest conflicts (ties broken at random),
+            for at most maxSteps steps (by default 100000, or one per variable if there are more; N Queens scales
+            the default with the board, see `NQueens::_solveMinConflicts`).
+            After a failed try the search restarts, at most restarts times.
+            The variables of initialAssignment are never moved. Every step counts as a search node.
+            maxNodes and timeout (in seconds) bound the search as a whole, see `CSP::budget`.
+            :return: the statistics of the search, with a complete and valid assignment in `SearchStats::solution`,
+                or None if none was found within the budget (local search cannot prove that there is no solution,
+                so `SearchStats::status` is UNKNOWN then, or TIMEOUT).
+        """
+        stats = self.startStats(stats)
+        with stats.measure(len(initialAssignment)), self.budget(stats, maxNodes, timeout, complete=False):
+            if self.isValid(initialAssignment):
+                stats.solution = self._solveMinConflicts(initialAssignment, maxSteps, restarts, seed)
+        return stats
+
+    def _solveMinConflicts(self, initialAssignment: Dict[Variable, Value], maxSteps: Optional[int], restarts: int,
+                           seed: Optional[int]) -> Optional[Dict[Variable, Value]]:
+        """ The local search of `CSP::solveMinConflicts`. """
+        stats = self.stats
+        rng = random.Random(seed)
+        graph = self.graph
+        variables, neighbors, isValidPairwise = graph.variables, graph.neighbors, self.isValidPairwise
+        if maxSteps is None: maxSteps = max(100000, len(variables))
+        domains = [[graph.values[k] for k in bitList(mask)] for mask in graph.startMasks]
+        fixed = [var in initialAssignment for var in variables]
+
+        def conflicts(i: int, value: Value, values: list) -> int:
+            var = variables[i]
+            return sum(1 for j in neighbors[i] if values[j] is not None
+                       and not isValidPairwise(var, value, variables[j], values[j]))
+
+        def bestValue(i: int, values: list) -> Tuple[Value, int]:
+            counts = [(conflicts(i, value, values), value) for value in domains[i]]
+            fewest = min(counts, key=lambda count: count[0])[0]
+            return rng.choice([value for count, value in counts if count == fewest]), fewest
+
+        for _ in range(restarts + 1):
+            values = [initialAssignment.get(var) for var in variables]
+            for i in rng.sample(range(len(variables)), len(variables)):
+                if not fixed[i]:
+                    values[i] = bestValue(i, values)[0]
+            counts = [conflicts(i, values[i], values) for i in range(len(variables))]
+            listed = [counts[i] > 0 and not fixed[i] for i in range(len(variables))]
+            candidates = [i for i in range(len(variables)) if listed[i]]
+
+            for _ in range(maxSteps):
+                if not candidates:
+                    return {var: value for var, value in zip(variables, values)}
+                if self.stopCondition is not None and self.stopCondition(): return None
+                k = rng.randrange(len(candidates))
+                i = candidates[k]
+                if counts[i] == 0:          # resolved by an earlier move
+                    candidates[k] = candidates[-1]
+                    candidates.pop()
+                    listed[i] = False
+                    continue
+                stats.nodes += 1
+                if stats.nodes == stats.nextSample: stats.sampled()
+                var, old = variables[i], values[i]
+                new, counts[i] = bestValue(i, values)
+                values[i] = new
+                for j in neighbors[i]:
+                    delta = (not isValidPairwise(var, new, variables[j], values[j])) \
+                            - (not isValidPairwise(var, old, variables[j], values[j]))
+                    if delta:
+                        counts[j] += delta
+                        if counts[j] > 0 and not listed[j] and not fixed[j]:
+                            listed[j] = True
+                            candidates.append(j)
+            if not candidates:
+                return {var: value for var, value in zip(variables, values)}
+        return None
+
+    def exactCover(self) -> Tuple[int, int, List[Tuple[Variable, Value, Tuple[int, ...]]]]:
+        """ Returns this CSP as an exact cover problem, for `CSP::solveDLX`: the number of primary columns, which a
+            solution covers exactly once, the number of secondary columns, which it covers at most once, and a row
+            (variable, value, columns) for every value of the start domain of every variable. Every variable needs
+            a primary column of its own, covered by its rows only, so that a cover assigns every variable once.
+            Only CSPs whose constraints all say that some assignments exclude each other are exact cover problems;
+            override for those.
+        """
+        raise ValueError(f"{type(self).__name__} cannot be solved as an exact cover problem.")
+
+    def solveDLX(self, initialAssignment: Dict[Variable, Value] = dict(), stats: Optional[SearchStats] = None,
+                 maxNodes: Optional[int] = None, timeout: Optional[float] = None) -> SearchStats:
+        """ Solves this CSP as an exact cover problem (see `CSP::exactCover`) with Algorithm X on dancing links,
+            see `dlx.exactCovers`. This needs neither the constraint graph nor a consistency check: the rows that
+            conflict with a choice leave the matrix, and the search branches on the constraint with the fewest
+            choices left. Every partial cover counts as a search node.
+            maxNodes and timeout (in seconds) bound the search, see `CSP::budget`.
+            :return: the statistics of the search, with a complete and valid assignment in `SearchStats::solution`,
+                or None if there is none.
+        """
+        self.checkInitialAssignment(initialAssignment)
+        stats = self.startStats(stats)
+        with stats.measure(len(initialAssignment)), self.budget(stats, maxNodes, timeout):
+            stats.solution = next(self._exactCovers(initialAssignment), None)
+        return stats
+
+    def _exactCovers(self, initialAssignment: Dict[Variable, Value]) -> Iterator[Dict[Variable, Value]]:
+        """ Yields the assignment of every exact cover of `CSP::exactCover` that extends initialAssignment. """
+        primary, secondary, rows = self.exactCover()
+        index = {(var, value): r for r, (var, value, _) in enumerate(rows)}
+        initial = []
+        for var, value in initialAssignment.items():
+            r = index.get((var, value))
+            if r is None:                   # not in the start domain of var
+                return
+            initial.append(r)
+        columns = [row[2] for row in rows]
+        for cover in exactCovers(primary, secondary, columns, initial, self.stats, self.stopCondition):
+            yield {rows[r][0]: rows[r][1] for r in cover}
 
     def ac3(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]]) -> Dict[Variable, Set[Value]]:
         """ Implement the AC3 algorithm from the theory lectures.
         :return: the new domains ensuring arc consistency.
+            The given domains are not modified, unless they are a trailing `BitDomains` store.
         """
-        # store all arcs in a queue
-        arc_queue = []
-        for variable in self.variables:
-            for neighbor in self.neighbors(variable):
-                if assignment.get(variable) is None and assignment.get(neighbor) is None:
-                    arc_queue.append((variable, neighbor))
+        if isinstance(domains, BitDomains):
+            return self._ac3Bits(assignment, domains, None)
+        return self._ac3Sets(assignment, domains, None)
 
-        while len(arc_queue) > 0:
-            tail, head = arc_queue.pop(0)
+    def ac2001(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]], residues: Optional[dict] = None) -> Dict[Variable, Set[Value]]:
+        """ AC3 with residual supports (AC-2001 / AC-3.1 style).
+            The last support found for every (arc, value) is cached in residues and checked first,
+            so supports are not searched for again while they are still in the domain of the head.
+            Residues stay valid hints after backtracking, so one dict can be reused for a whole solve.
+        :return: the new domains ensuring arc consistency.
+        """
+        if residues is None: residues = dict()
+        if isinstance(domains, BitDomains):
+            return self._ac3Bits(assignment, domains, residues)
+        return self._ac3Sets(assignment, domains, residues)
+
+    def arcConsistency(self, algorithm: str = "ac3") -> Callable[[Dict[Variable, Value], Dict[Variable, Set[Value]]], Dict[Variable, Set[Value]]]:
+        """ Returns the arc consistency algorithm to use for one solve: "ac3" or "ac2001". """
+        if algorithm == "ac3":
+            return self.ac3
+        elif algorithm == "ac2001":
+            return partial(self.ac2001, residues=dict())
+        raise ValueError(f"Unknown arc consistency algorithm '{algorithm}'.")
+
+    def _ac3Sets(self, assignment: Dict[Variable, Value], domains: Dict[Variable, Set[Value]], residues: Optional[dict]) -> Dict[Variable, Set[Value]]:
+        """ `CSP::ac3` on set domains, using residual supports if residues is not None. """
+        graph = self.graph
+        domains = dict(domains)
+        ids = assignedIds(graph, assignment)
+        # store all arcs in a queue, and the arcs that are in it in a set
+        arc_queue = deque((variable, neighbor)
+                          for i, (variable, neighbors) in enumerate(zip(graph.variables, graph.neighborVars)) if ids[i] < 0
+                          for j, neighbor in zip(graph.neighbors[i], neighbors) if ids[j] < 0)
+        queued = set(arc_queue)
+        stats = self.stats if self.stats is not None else SearchStats()
+        supports, valueIndex, index = graph.supports, graph.valueIndex, graph.index
+
+        while arc_queue:
+            arc = arc_queue.popleft()
+            queued.discard(arc)
+            stats.revisions += 1
+            tail, head = arc
+            head_domain = domains[head]
             values_removed = False
+            arc_residues = None if residues is None else residues.setdefault(arc, dict())
+            table = supports[index[tail]][index[head]] if supports is not None else None
+
+            # remove inconsistent values, replacing the set so domains shared with other search levels are untouched
+            for v in domains[tail]:
+                if arc_residues is not None:
+                    w = arc_residues.get(v)
+                    if w is not None and w in head_domain:
+                        continue
+                row = table[valueIndex[v]] if table is not None else None
+                for w in head_domain:
+                    if row >> valueIndex[w] & 1 if row is not None else self.isValidPairwise(tail, v, head, w):
+                        if arc_residues is not None: arc_residues[v] = w
+                        break
+                else:
+                    if not values_removed:
+                        domains[tail] = set(domains[tail])
+                        values_removed = True
+                    domains[tail].remove(v)
 
-            # remove inconsistent values
-            for v in domains.get(tail).copy():
-                valid = False
-                for w in domains.get(head):
-                    if self.isValidPairwise(tail, v, head, w):
-                        valid = True
-                if not valid:
-                    domains.get(tail).remove(v)
-                    values_removed = True
-
-            # add arcs if values were removed
+            # add arcs if values were removed, stop as soon as a domain is empty
             if values_removed:
-                for new_tail in self.neighbors(tail):
-                    if assignment.get(new_tail) is None and not (new_tail, tail) in arc_queue:
-                        arc_queue.append((new_tail, tail))
+                if not domains[tail]: return domains
+                i = index[tail]
+                for j, new_tail in zip(graph.neighbors[i], graph.neighborVars[i]):
+                    new_arc = (new_tail, tail)
+                    if ids[j] < 0 and new_arc not in queued:
+                        arc_queue.append(new_arc)
+                        queued.add(new_arc)
         return domains
 
+    def _ac3Bits(self, assignment: Dict[Variable, Value], domains: BitDomains, residues: Optional[dict]) -> BitDomains:
+        """ `CSP::ac3` on a `BitDomains` store, using residual supports if residues is not None.
+            Residues are stored per arc as a list of support value ids, indexed by value id.
+        """
+        graph = self.graph
+        variables, values, neighbors = graph.variables, graph.values, graph.neighbors
+        if domains.trail is None: domains = domains.copy()
+        masks = domains.masks
+        unassigned = [k < 0 for k in assignedIds(graph, assignment)]
+        arc_queue = deque((i, j) for i in range(len(variables)) if unassigned[i] for j in neighbors[i] if unassigned[j])
+        queued = set(arc_queue)
+        stats = self.stats if self.stats is not None else SearchStats()
+        supports = graph.supports
+
+        while arc_queue:
+            arc = arc_queue.popleft()
+            queued.discard(arc)
+            stats.revisions += 1
+            tail, head = arc
+            tail_var, head_var = variables[tail], variables[head]
+            tail_mask, head_mask = masks[tail], masks[head]
+            if supports is not None:
+                # one AND per value: the values without a support in the head domain are removed
+                table = supports[tail][head]
+                for v in bitList(tail_mask):
+                    if not table[v] & head_mask:
+                        tail_mask ^= 1 << v
+            else:
+                arc_residues = None
+                if residues is not None:
+                    arc_residues = residues.get(arc)
+                    if arc_residues is None:
+                        arc_residues = residues[arc] = [-1] * len(values)
+
+                # remove inconsistent values
+                head_values = None
+                for v in bitList(tail_mask):
+                    if arc_residues is not None:
+                        w = arc_residues[v]
+                        if w >= 0 and head_mask >> w & 1:
+                            continue
+                    if head_values is None:
+                        head_values = [(w, values[w]) for w in bitList(head_mask)]
+                    for w, head_value in head_values:
+                        if self.isValidPairwise(tail_var, values[v], head_var, head_value):
+                            if arc_residues is not None: arc_residues[v] = w
+                            break
+                    else:
+                        tail_mask ^= 1 << v
+
+            # add arcs if values were removed, stop as soon as a domain is empty
+            if tail_mask != masks[tail]:
+                domains.prune(tail, tail_mask)
+                if not tail_mask: return domains
+                for new_tail in neighbors[tail]:
+                    new_arc = (new_tail, tail)
+                    if unassigned[new_tail] and new_arc not in queued:
+                        arc_queue.append(new_arc)
+                        queued.add(new_arc)
+        return domains
 
-def domainsFromAssignment(assignment: Dict[Variable, Value], variables: Set[Variable]) -> Dict[Variable, Set[Value]]:
+def domainsFromAssignment(assignment: Dict[Variable, Value], variables: Iterable[Variable]) -> Dict[Variable, Set[Value]]:
     """ Fills in the initial domains for each variable.
         Already assigned variables only contain the given value in their domain.
     """
@@ -1,12 +1,23 @@
-from typing import Set, Dict
+import random
+from typing import Set, Dict, Iterator, List, Optional, Tuple
 
-from CSP import CSP, Variable, Value
+from CSP import CSP, Variable, Value, ConsistencyChecker
 
 
 class NQueens(CSP):
-    def __init__(self, n=4):
+    def __init__(self, n=4, symmetryBreaking=False):
+        """ With symmetryBreaking, the search only looks for solutions with the queen of the first column in the
+            top half of the board and above the queen of the last column. Every solution has a reflection or
+            rotation like that, and `NQueens::expandSolution` and `NQueens::solutionWeight` restore the others
+            when enumerating or counting solutions. The reflections could move the queens of an initial assignment,
+            so the systematic solvers reject one (see `NQueens::checkInitialAssignment`).
+        """
         self.n = n
-        self._variables = set(Queen(col, self.n) for col in range(self.n))
+        self.symmetryBreaking = symmetryBreaking
+        self.queens = [Queen(col, self.n) for col in range(self.n)]      # indexed by column
+        if symmetryBreaking:
+            self.queens[0] = Queen(0, self.n, maxRow=(self.n - 1) // 2)
+        self._variables = set(self.queens)
 
     @property
     def variables(self) -> Set['Queen']:
@@ -28,8 +39,242 @@ class NQueens(CSP):
         if abs(row1 - row2) == abs(col1 - col2):        # diagonal
             return False
 
+        if self.symmetryBreaking and col1 + col2 == self.n - 1 and col1 * col2 == 0:
+            return (row1 < row2) == (col1 < col2)       # first column above the last one
+
+        return True
+
+    def isValid(self, assignment: Dict['Queen', Value]) -> bool:
+        """ Return whether no two queens of assignment share a row or a diagonal, and with symmetryBreaking, whether
+            the first queen is in the top half and above the last queen (see `NQueens::isValidPairwise`).
+            Uses occupancy sets, so it is linear in the number of queens and never builds the constraint graph.
+        """
+        if self.symmetryBreaking:
+            first, last = assignment.get(self.queens[0]), assignment.get(self.queens[-1])
+            if first is not None and first > self.queens[0].maxRow:
+                return False
+            if self.n > 1 and first is not None and last is not None and first >= last:
+                return False
+        rows, diagonals, antiDiagonals = set(), set(), set()
+        for var, row in assignment.items():
+            diagonal, antiDiagonal = row - var.col, row + var.col
+            if row in rows or diagonal in diagonals or antiDiagonal in antiDiagonals:
+                return False
+            rows.add(row)
+            diagonals.add(diagonal)
+            antiDiagonals.add(antiDiagonal)
         return True
 
+    def checkInitialAssignment(self, initialAssignment: Dict['Queen', Value]):
+        """ Raises ValueError for an initial assignment with symmetryBreaking: the solutions extending it need not
+            be the ones the symmetry breaking constraints keep.
+        """
+        if self.symmetryBreaking and initialAssignment:
+            raise ValueError("Symmetry breaking does not support an initial assignment.")
+
+    def _solveMinConflicts(self, initialAssignment: Dict['Queen', Value], maxSteps: Optional[int], restarts: int,
+                           seed: Optional[int]) -> Optional[Dict['Queen', Value]]:
+        """ Min-conflicts local search specialized for N Queens with NumPy, fast enough for a million queens.
+            Every swap attempt counts as a search node; maxSteps defaults to 50 per queen (at least 1000).
+            Falls back to the generic search without NumPy, or with symmetryBreaking and an initial assignment.
+        """
+        try:
+            import numpy
+        except ImportError:
+            return super()._solveMinConflicts(initialAssignment, maxSteps, restarts, seed)
+        if self.symmetryBreaking and initialAssignment:         # the reflections below could move its queens
+            return super()._solveMinConflicts(initialAssignment, maxSteps, restarts, seed)
+
+        n, rng, stats, stopCondition = self.n, random.Random(seed), self.stats, self.stopCondition
+        if maxSteps is None: maxSteps = max(50 * n, 1000)
+        fixed = numpy.zeros(n, dtype=bool)
+        for var in initialAssignment:
+            fixed[var.col] = True
+        free_columns = [col for col in range(n) if not fixed[col]]
+        taken_rows = set(initialAssignment.values())
+        free_rows = [row for row in range(n) if row not in taken_rows]
+        columns = numpy.arange(n)
+
+        # the rows of the queens are kept a permutation, so only diagonals can conflict
+        for _ in range(restarts + 1):
+            board = [0] * n                                     # row of the queen in every column
+            diagonals = [0] * (2 * n - 1)                       # indexed by row - col + n - 1
+            antiDiagonals = [0] * (2 * n - 1)                   # indexed by row + col
+            for var, row in initialAssignment.items():
+                board[var.col] = row
+                diagonals[row - var.col + n - 1] += 1
+                antiDiagonals[row + var.col] += 1
+            # place the queens greedily: each column takes a random free row, retrying a few times for free diagonals
+            rng.shuffle(free_columns)
+            random_fraction = rng.random
+            rows = list(free_rows)
+            for t, col in enumerate(free_columns):
+                for _ in range(64):
+                    k = t + int(random_fraction() * (len(rows) - t))
+                    row = rows[k]
+                    if not diagonals[row - col + n - 1] and not antiDiagonals[row + col]:
+                        break
+                rows[t], rows[k] = rows[k], rows[t]
+                board[col] = row
+                diagonals[row - col + n - 1] += 1
+                antiDiagonals[row + col] += 1
+            # count the queens on every diagonal, so each swap is evaluated and applied in O(1)
+            board = numpy.array(board)
+            diagonals = numpy.array(diagonals)
+            antiDiagonals = numpy.array(antiDiagonals)
+
+            def attacks(row: int, col: int) -> int:
+                """ Number of queens on the diagonals through (row, col), not counting a queen on it. """
+                return int(diagonals[row - col + n - 1] + antiDiagonals[row + col])
+
+            def move(row: int, col: int, delta: int):
+                diagonals[row - col + n - 1] += delta
+                antiDiagonals[row + col] += delta
+
+            # swaps never make things worse, so a try can get stuck in a local minimum: after maxSteps swap
+            # attempts, start over
+            steps = counted = 0
+            while steps < maxSteps:
+                # recount the conflicts (vectorized) once all known conflicted queens are resolved
+                counts = diagonals[board - columns + n - 1] + antiDiagonals[board + columns] - 2
+                candidates = numpy.flatnonzero((counts > 0) & ~fixed).tolist()
+                if not candidates:
+                    stats.nodes += steps - counted
+                    board = board.tolist()
+                    if self.symmetryBreaking:       # take the reflection or rotation that the constraints allow
+                        board = min(other for other in self.symmetricBoards(board) if self._symmetryAllows(other))
+                    return {queen: int(row) for queen, row in zip(self.queens, board)}
+                if len(free_columns) < 2: break
+                # a random conflicted queen swaps rows with a random other queen if that adds no conflicts
+                while candidates and steps < maxSteps:
+                    k = int(random_fraction() * len(candidates))
+                    i = candidates[k]
+                    row_i = int(board[i])
+                    if attacks(row_i, i) == 2:          # resolved by an earlier swap
+                        candidates[k] = candidates[-1]
+                        candidates.pop()
+                        continue
+                    j = free_columns[int(random_fraction() * len(free_columns))]
+                    if j == i: continue
+                    steps += 1
+                    if not steps & 1023:            # add the nodes to the stats and check the stop condition
+                        stats.nodes += steps - counted
+                        counted = steps
+                        if stopCondition is not None and stopCondition(): return None
+                    row_j = int(board[j])
+                    move(row_i, i, -1)
+                    before = attacks(row_i, i)
+                    move(row_j, j, -1)
+                    before += attacks(row_j, j)
+                    after = attacks(row_j, i)
+                    move(row_j, i, 1)
+                    after += attacks(row_i, j)
+                    if after <= before:
+                        move(row_i, j, 1)
+                        board[i], board[j] = row_j, row_i
+                        if after:
+                            candidates.append(j)
+                    else:
+                        move(row_j, i, -1)
+                        move(row_i, i, 1)
+                        move(row_j, j, 1)
+            stats.nodes += steps - counted
+        return None
+
+    def exactCover(self) -> Tuple[int, int, List[Tuple['Queen', Value, Tuple[int, ...]]]]:
+        """ Returns the N Queens problem as an exact cover problem: every column and row has one queen (2n primary
+            columns) and every diagonal at most one (2 (2n - 1) secondary columns), with a row for every square.
+            The symmetry breaking order of the first and last queen is not part of the cover, only the half board
+            of the first queen, so covers can be boards that `NQueens::expandSolution` leaves to another cover.
+        """
+        n = self.n
+        rows = []
+        for queen in self.queens:
+            col = queen.col
+            for row in sorted(queen.startDomain):
+                rows.append((queen, row, (col, n + row, 2 * n + row - col + n - 1, 4 * n - 1 + row + col)))
+        return 2 * n, 2 * (2 * n - 1), rows
+
+    def countSolutions(self, method: str = "fc", initialAssignment: Dict['Queen', Value] = dict(), **options) -> int:
+        """ Counts the solutions like `CSP::countSolutions`, or with the method "bitmask", with bitmask
+            backtracking, which is much faster than the CSP search: the rows and diagonals that are taken are kept
+            in three ints, and the free rows of a column are one bit operation. Only the first half of the rows of
+            the first column are searched, mirroring the count for the rest. Every placed queen counts as a search
+            node. The bitmask count takes no initial assignment and no options but stats.
+        """
+        if method != "bitmask":
+            return super().countSolutions(method, initialAssignment, **options)
+        if initialAssignment:
+            raise ValueError("The bitmask count does not take an initial assignment.")
+        stats = self.startStats(options.pop("stats", None))
+        if options:
+            raise TypeError(f"Unexpected options for bitmask: {', '.join(options)}")
+        n = self.n
+        full = (1 << n) - 1
+
+        def place(rows: int, down: int, up: int) -> int:
+            """ Counts the completions of a board with the given taken rows and diagonals in the next column. """
+            stats.nodes += 1
+            if rows == full: return 1
+            count = 0
+            free = full & ~(rows | down | up)
+            while free:
+                bit = free & -free
+                free ^= bit
+                count += place(rows | bit, (down | bit) << 1 & full, (up | bit) >> 1)
+            return count
+
+        with stats.measure():
+            count = 0
+            for row in range(n // 2):
+                bit = 1 << row
+                count += 2 * place(bit, bit << 1 & full, bit >> 1)
+            if n % 2:
+                bit = 1 << n // 2
+                count += place(bit, bit << 1 & full, bit >> 1)
+        return count
+
+    def symmetricBoards(self, board: Tuple[int, ...]) -> Set[Tuple[int, ...]]:
+        """ Returns the distinct boards (rows indexed by column) that are reflections or rotations of board. """
+        n = self.n
+        transposed = [0] * n
+        for col, row in enumerate(board):
+            transposed[row] = col
+        boards = set()
+        for rows in (tuple(board), tuple(transposed)):
+            flipped = tuple(n - 1 - row for row in rows)
+            boards.update((rows, flipped, rows[::-1], flipped[::-1]))
+        return boards
+
+    def _orbit(self, assignment: Dict['Queen', Value]) -> List[Tuple[int, ...]]:
+        """ Returns the boards symmetric to assignment if it is the smallest of them that the symmetry breaking
+            constraints allow (so each set of symmetric solutions is produced once), and no boards otherwise.
+        """
+        board = tuple(assignment[queen] for queen in self.queens)
+        boards = self.symmetricBoards(board)
+        allowed = (other for other in boards if self._symmetryAllows(other))
+        return sorted(boards) if min(allowed) == board else []
+
+    def _symmetryAllows(self, board: Tuple[int, ...]) -> bool:
+        """ Returns whether a full board satisfies the symmetry breaking constraints. """
+        return board[0] <= (self.n - 1) // 2 and (self.n == 1 or board[0] < board[-1])
+
+    def expandSolution(self, assignment: Dict['Queen', Value]) -> Iterator[Dict['Queen', Value]]:
+        if not self.symmetryBreaking:
+            yield assignment
+            return
+        for board in self._orbit(assignment):
+            yield dict(zip(self.queens, board))
+
+    def solutionWeight(self, assignment: Dict['Queen', Value]) -> int:
+        if not self.symmetryBreaking:
+            return 1
+        return len(self._orbit(assignment))
+
+    def consistencyChecker(self, assignment: Dict['Queen', Value]) -> 'QueenChecker':
+        """ Returns a checker that uses row and diagonal occupancy counters. """
+        return QueenChecker(self, assignment)
+
     def assignmentToStr(self, assignment: Dict['Queen', Value]) -> str:
         """ Formats the assignment of variables for this CSP into a string. """
         if len(assignment) > 80:
@@ -49,14 +294,54 @@ class NQueens(CSP):
         return s
 
 
+class QueenChecker(ConsistencyChecker):
+    """ Counts the queens on every row and diagonal, so each check and update is O(1). """
+    def __init__(self, csp: NQueens, assignment: Dict['Queen', Value]):
+        super().__init__(csp, assignment)
+        n = csp.n
+        self.rows = [0] * n
+        self.diagonals = [0] * (2 * n - 1)          # indexed by row - col + n - 1
+        self.antiDiagonals = [0] * (2 * n - 1)      # indexed by row + col
+        self.first, self.last = (csp.queens[0], csp.queens[-1]) if csp.symmetryBreaking and n > 1 else (None, None)
+        for var, row in assignment.items():
+            self.assign(var, row)
+
+    def isConsistent(self, var: 'Queen', value: Value) -> bool:
+        col = var.col
+        if self.rows[value] or self.diagonals[value - col + var.boardsize - 1] or self.antiDiagonals[value + col]:
+            return False
+        if var is self.first:
+            other = self.assignment.get(self.last)
+            return other is None or value < other
+        if var is self.last:
+            other = self.assignment.get(self.first)
+            return other is None or other < value
+        return True
+
+    def assign(self, var: 'Queen', value: Value):
+        col = var.col
+        self.rows[value] += 1
+        self.diagonals[value - col + var.boardsize - 1] += 1
+        self.antiDiagonals[value + col] += 1
+
+    def unassign(self, var: 'Queen', value: Value):
+        col = var.col
+        self.rows[value] -= 1
+        self.diagonals[value - col + var.boardsize - 1] -= 1
+        self.antiDiagonals[value + col] -= 1
+
+
 class Queen(Variable):
-    def __init__(self, col, boardsize):
+    __slots__ = ('col', 'boardsize', 'maxRow')
+
+    def __init__(self, col, boardsize, maxRow=None):
         self.col = col
         self.boardsize = boardsize
+        self.maxRow = maxRow        # if not None, the queen is restricted to rows 0..maxRow
 
     def __repr__(self):
         return f"Q{self.col}"
 
     @property
     def startDomain(self) -> Set[Value]:
-        return set(range(self.boardsize))
+        return set(range(self.boardsize if self.maxRow is None else self.maxRow + 1))
@@ -1,12 +1,62 @@
-from typing import Set, Dict
+from functools import partial
+from math import isqrt
+from typing import Set, Dict, List, Optional, Tuple
+
+from CSP import CSP, Variable, Value, ConsistencyChecker
+
+# characters of the values in puzzle files and lines: '0' (or '.') for an empty cell, then 1-9 and A (10) to Z (35)
+VALUE_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def parseValue(token: str) -> int:
+    """ Returns the value of a cell written as one character of VALUE_CHARS (or '.'), or as a decimal number. """
+    if token == '.':
+        return 0
+    if len(token) == 1:
+        value = VALUE_CHARS.find(token.upper())
+        if value < 0:
+            raise ValueError(f"Impossible value '{token}' in grid")
+        return value
+    return int(token)
+
+
+def formatValue(value: Optional[int]) -> str:
+    return VALUE_CHARS[value or 0]
+
+
+def readGrid(path: str) -> List[List[int]]:
+    """ Reads a grid of values from file, one row per line and 0 for empty cells. A row is either a string of
+        characters (see VALUE_CHARS), or whitespace separated numbers. Blank lines are skipped.
+    """
+    rows = []
+    with open(path, "r") as file:
+        for line in file:
+            if line.isspace() or not line:
+                continue
+            tokens = line.split()
+            if len(tokens) == 1:
+                tokens = list(tokens[0])
+            rows.append([parseValue(token) for token in tokens])
+    return rows
 
-from CSP import CSP, Variable, Value
 
 class Sudoku(CSP):
-    def __init__(self):
+    """ Sudoku of n² × n² cells with boxes of n × n cells, to fill in with the values 1 to n²; n is 3 by default. """
+    def __init__(self, n: int = 3):
         super().__init__()
-        self._variables = list(Cell(row, col) for col in range(9) for row in range(9))
-        # TODO: Implement Sudoku::__init__ (problem 4)
+        self.n = n
+        self.size = n * n
+        self._variables = list(Cell(row, col, n) for col in range(self.size) for row in range(self.size))
+
+    @classmethod
+    def fromFile(cls, path: str) -> Tuple['Sudoku', Dict['Cell', Value]]:
+        """ Returns the Sudoku of the size of the grid in file, and the initial assignment of the grid. """
+        rows = readGrid(path)
+        n = isqrt(len(rows))
+        if n * n != len(rows) or n < 1:
+            raise ValueError(f"A sudoku needs n² rows, not {len(rows)}")
+        csp = cls(n)
+        return csp, csp._gridAssignment(rows)
 
     @property
     def variables(self) -> Set['Cell']:
@@ -15,74 +65,151 @@ class Sudoku(CSP):
 
     def getCell(self, x: int, y: int) -> 'Cell':
         """ Get the variable corresponding to the cell on (x, y) """
-        return self._variables[x*9 + y]
+        return self._variables[x*self.size + y]
 
     def neighbors(self, var: 'Cell') -> Set['Cell']:
         """ Return all variables related to var by some constraint. """
-        neighbors = set()
-        for cell in self.variables - {var}:
-            if var.isNeighborOf(cell):
-                neighbors.add(cell)
-        return neighbors
+        return {cell for cell in self._variables if cell is not var and var.isNeighborOf(cell)}
 
     def isValidPairwise(self, var1: 'Cell', val1: Value, var2: 'Cell', val2: Value) -> bool:
         """ Return whether this pairwise assignment is valid with the constraints of the csp. """
-        return not var2 in self.neighbors(var1) or val1 != val2
+        return var1 is var2 or not var1.isNeighborOf(var2) or val1 != val2
+
+    def constraintKey(self, var1: 'Cell', var2: 'Cell') -> int:
+        """ Every constraint of a Sudoku is val1 != val2, so all of them share one compatibility table. """
+        return 0
+
+    def consistencyChecker(self, assignment: Dict['Cell', Value]) -> 'SudokuChecker':
+        """ Returns a checker that uses row, column and box occupancy masks. """
+        return SudokuChecker(self, assignment)
+
+    def units(self) -> List[List[int]]:
+        """ Returns the rows, columns and boxes of the grid as lists of variable ids in the constraint graph. """
+        graph = self.graph
+        cached = self.__dict__.get('_units')
+        if cached is None or cached[0] is not graph:
+            units = [[] for _ in range(3 * self.size)]
+            for i, cell in enumerate(graph.variables):
+                units[cell.row].append(i)
+                units[self.size + cell.col].append(i)
+                units[2 * self.size + cell.square].append(i)
+            cached = self._units = (graph, units)
+        return cached[1]
+
+    def exactCover(self) -> Tuple[int, int, List[Tuple['Cell', Value, Tuple[int, ...]]]]:
+        """ Returns the Sudoku as an exact cover problem: every cell has one value, and every row, column and box
+            has every value once, which makes 4 (n²)² primary columns and a row for every cell and value.
+        """
+        size = self.size
+        cells = size * size
+        rows = []
+        for i, cell in enumerate(self._variables):
+            for value in range(1, size + 1):
+                v = value - 1
+                rows.append((cell, value, (i, cells + cell.row * size + v, 2 * cells + cell.col * size + v,
+                                           3 * cells + cell.square * size + v)))
+        return 4 * cells, 0, rows
+
+    def arcConsistency(self, algorithm: str = "ac3"):
+        """ Returns the propagation to use after forward checking for one solve: "ac3" or "ac2001" (see
+            `CSP::arcConsistency`), or the all-different propagation of the rows, columns and boxes, see
+            `alldiff.allDifferent`: "alldiff" for naked and hidden singles, "regin" with matching based filtering.
+        """
+        if algorithm in ("alldiff", "regin"):
+            from alldiff import allDifferent
+            return partial(allDifferent, self, matching=algorithm == "regin")
+        return super().arcConsistency(algorithm)
 
     def assignmentToStr(self, assignment: Dict['Cell', Value]) -> str:
         """ Formats the assignment of variables for this CSP into a string. """
+        n, size = self.n, self.size
         s = ""
-        for y in range(9):
-            if y != 0 and y % 3 == 0:
-                s += "---+---+---\n"
-            for x in range(9):
-                if x != 0 and x % 3 == 0:
+        for y in range(size):
+            if y != 0 and y % n == 0:
+                s += "+".join(["-" * n] * n) + "\n"
+            for x in range(size):
+                if x != 0 and x % n == 0:
                     s += '|'
 
                 cell = self.getCell(x, y)
-                s += str(assignment.get(cell, ' '))
+                value = assignment.get(cell)
+                s += ' ' if value is None else formatValue(value)
             s += "\n"
         return s
 
     def parseAssignment(self, path: str) -> Dict['Cell', Value]:
-        """ Gives an initial assignment for a Sudoku board from file. """
-        initialAssignment = dict()
+        """ Gives an initial assignment for a Sudoku board from file, see `readGrid` for the format. """
+        return self._gridAssignment(readGrid(path))
 
-        with open(path, "r") as file:
-            for y, line in enumerate(file.readlines()):
-                if line.isspace():
+    def _gridAssignment(self, rows: List[List[int]]) -> Dict['Cell', Value]:
+        """ Gives the initial assignment of a grid given as rows of values, with 0 for empty cells. """
+        size = self.size
+        assert len(rows) == size, f"A sudoku of size {size} needs {size} rows"
+        initialAssignment = dict()
+        for y, row in enumerate(rows):
+            assert len(row) == size, f"Row {y + 1} of the sudoku needs {size} cells"
+            for x, val in enumerate(row):
+                if val == 0:
                     continue
-                assert y < 9, "Too many rows in sudoku"
-
-                for x, char in enumerate(line):
-                    if char.isspace():
-                        continue
-
-                    assert x < 9, "Too many columns in sudoku"
-
-                    var = self.getCell(x, y)
-                    val = int(char)
-
-                    if val == 0:
-                        continue
-
-                    assert val > 0 and val < 10, f"Impossible value in grid"
-                    initialAssignment[var] = val
+                assert 0 < val <= size, f"Impossible value in grid"
+                initialAssignment[self.getCell(x, y)] = val
         return initialAssignment
 
+    def parseLine(self, line: str) -> Dict['Cell', Value]:
+        """ Gives an initial assignment for a Sudoku board given as one line of (n²)² characters (81 by default),
+            row by row, with '0' or '.' for empty cells and the characters of VALUE_CHARS for the values.
+        """
+        line = line.strip()
+        size = self.size
+        assert len(line) == size * size, f"A sudoku line needs {size * size} cells"
+        return self._gridAssignment([[parseValue(char) for char in line[y * size:(y + 1) * size]] for y in range(size)])
+
+    def assignmentToLine(self, assignment: Dict['Cell', Value]) -> str:
+        """ Formats the assignment as one line of (n²)² characters, row by row, with '0' for empty cells. """
+        return "".join(formatValue(assignment.get(self.getCell(x, y))) for y in range(self.size) for x in range(self.size))
+
+
+class SudokuChecker(ConsistencyChecker):
+    """ Keeps a bitmask of the values used in every row, column and box. """
+    def __init__(self, csp: Sudoku, assignment: Dict['Cell', Value]):
+        super().__init__(csp, assignment)
+        self.rows = [0] * csp.size
+        self.cols = [0] * csp.size
+        self.squares = [0] * csp.size
+        for var, value in assignment.items():
+            self.assign(var, value)
+
+    def isConsistent(self, var: 'Cell', value: Value) -> bool:
+        return not (self.rows[var.row] | self.cols[var.col] | self.squares[var.square]) >> value & 1
+
+    def assign(self, var: 'Cell', value: Value):
+        bit = 1 << value
+        self.rows[var.row] |= bit
+        self.cols[var.col] |= bit
+        self.squares[var.square] |= bit
+
+    def unassign(self, var: 'Cell', value: Value):
+        bit = ~(1 << value)
+        self.rows[var.row] &= bit
+        self.cols[var.col] &= bit
+        self.squares[var.square] &= bit
+
 
 class Cell(Variable):
-    def __init__(self, row, col):
+    __slots__ = ('value', 'row', 'col', 'square', 'size')
+
+    def __init__(self, row, col, n: int = 3):
         super().__init__()
         self.value = -1
         self.row = row
         self.col = col
-        self.square = int(row/3)*3 + int(col/3)
+        self.square = (row // n) * n + col // n
+        self.size = n * n
 
     @property
     def startDomain(self) -> Set[Value]:
         """ Returns the set of initial values of this variable (not taking constraints into account). """
-        return set(range(9))
+        return set(range(1, self.size + 1))
 
     def __repr__(self):
         return str(self.row) + '/' + str(self.col) + '/' + str(self.square)
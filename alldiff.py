@@ -0,0 +1,229 @@
+""" Propagation of all-different constraints over units of variables, e.g. the rows, columns and boxes of a Sudoku.
+    Pairwise != constraints only remove the value of an assigned variable from its neighbors; an all-different
+    propagator also sees the values that have a single place left in a unit (hidden singles), and with matching
+    based filtering (Régin) every value that cannot be part of any assignment of the unit.
+"""
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+from domains import BitDomains, bitList
+from stats import SearchStats
+
+if TYPE_CHECKING:
+    from CSP import CSP, Variable, Value
+
+
+def allDifferent(csp: 'CSP', assignment: Dict['Variable', 'Value'], domains, matching: bool = False):
+    """ Propagates the all-different constraints of the units of csp (`csp.units()`, lists of variable ids in which
+        all values must differ, and which must take all the values of their domains) into domains, until nothing
+        changes:
+        - naked singles: the value of a variable with a single value is removed from the rest of its units;
+        - hidden singles: a variable that is the only place for a value in a unit gets that value;
+        - if matching is set, values that are not in any maximum matching of the unit's variables and values.
+        A unit without a place for one of its values, or with two variables left with the same single value,
+        has no solution, which is reported by emptying the domain of one of its unassigned variables.
+        Can be used as the arcConsistency of `CSP::solveAC3`; every unit looked at counts as a revision.
+        :return: the new domains. The given domains are not modified, unless they are a trailing `BitDomains` store.
+    """
+    graph = csp.graph
+    units = csp.units()
+    stats = csp.stats if csp.stats is not None else SearchStats()
+    bits = isinstance(domains, BitDomains)
+    if bits:
+        masks = list(domains.masks)
+    else:
+        valueIndex = graph.valueIndex
+        masks = [sum(1 << valueIndex[value] for value in domains[var]) for var in graph.variables]
+    assigned = [False] * len(masks)
+    for var, value in assignment.items():
+        i = graph.index[var]
+        assigned[i] = True
+        masks[i] = 1 << graph.valueIndex[value]
+    original = list(masks)
+
+    failed = _propagate(units, masks, graph.startMasks, stats, matching)
+    if failed is not None:
+        unassigned = [i for i in failed if not assigned[i]]
+        if unassigned:
+            masks[unassigned[0]] = 0
+
+    if bits:
+        if domains.trail is None: domains = domains.copy()
+        for i, mask in enumerate(masks):
+            if mask != original[i] and not assigned[i]:
+                domains.prune(i, mask)
+        return domains
+    domains = dict(domains)
+    values = graph.values
+    for i, mask in enumerate(masks):
+        if mask != original[i] and not assigned[i]:
+            domains[graph.variables[i]] = {values[k] for k in bitList(mask)}
+    return domains
+
+
+def _propagate(units: List[List[int]], masks: List[int], startMasks: List[int], stats: SearchStats,
+               matching: bool) -> Optional[List[int]]:
+    """ Runs the rules of `allDifferent` on masks in place until nothing changes.
+        Hidden singles only apply to the units that have as many variables as values, which must take every value.
+        :return: a unit without solution, or None.
+    """
+    fullMasks = [0] * len(units)
+    for u, unit in enumerate(units):
+        for i in unit:
+            fullMasks[u] |= startMasks[i]
+        if fullMasks[u].bit_count() != len(unit):
+            fullMasks[u] = None
+    changed = True
+    while changed:
+        changed = False
+        for u, unit in enumerate(units):
+            stats.revisions += 1
+            # naked singles
+            fixed = 0
+            for i in unit:
+                mask = masks[i]
+                if not mask & (mask - 1):
+                    if mask & fixed or not mask: return unit
+                    fixed |= mask
+            # hidden singles, on the values that are not fixed yet
+            once = twice = 0
+            for i in unit:
+                mask = masks[i]
+                if mask & (mask - 1):
+                    mask &= ~fixed
+                    if mask != masks[i]:
+                        masks[i] = mask
+                        changed = True
+                        if not mask: return unit
+                twice |= once & mask
+                once |= mask
+            if fullMasks[u] is None: continue
+            if once | fixed != fullMasks[u]: return unit
+            hidden = once & ~twice & ~fixed
+            if hidden:
+                for i in unit:
+                    mask = masks[i] & hidden
+                    if mask and mask != masks[i]:
+                        if mask & (mask - 1): return unit
+                        masks[i] = mask
+                        changed = True
+        if matching and not changed:
+            for unit in units:
+                stats.revisions += 1
+                result = _matchingFilter(unit, masks)
+                if result is None: return unit
+                changed |= result
+    return None
+
+
+def _matchingFilter(unit: List[int], masks: List[int]) -> Optional[bool]:
+    """ Removes the values that are in no maximum matching of the variables of unit to their values (Régin).
+        The variables are matched to values with augmenting paths; an unmatched edge (variable, value) can then be
+        part of a maximum matching only if it is on an alternating cycle, i.e. if the variable and the variable
+        matched to the value are in the same strongly connected component of the graph with an edge from every
+        variable to the variables matched to the other values in its domain, or on an alternating path from a
+        free value, i.e. if the value's variable can be reached from a variable that has a free value.
+        :return: whether masks changed, or None if the variables cannot all get a different value.
+    """
+    n = len(unit)
+    domains = [bitList(masks[i]) for i in unit]
+    owner: Dict[int, int] = dict()          # value -> position in unit of the variable matched to it
+    match = [-1] * n
+
+    def augment(v: int, seen: set) -> bool:
+        for value in domains[v]:
+            if value in seen: continue
+            seen.add(value)
+            w = owner.get(value)
+            if w is None or augment(w, seen):
+                owner[value] = v
+                match[v] = value
+                return True
+        return False
+
+    for v in range(n):
+        for value in domains[v]:            # greedy start
+            if value not in owner:
+                owner[value] = v
+                match[v] = value
+                break
+    for v in range(n):
+        if match[v] < 0 and not augment(v, set()):
+            return None
+
+    # edge v -> w when v can take the value matched to w; free values make their variables reachable from outside
+    edges = [[owner[value] for value in domains[v] if value != match[v] and value in owner] for v in range(n)]
+    free = [any(value not in owner for value in domains[v]) for v in range(n)]
+    component = _components(edges)
+    # the variables from which a variable with a free value can be reached may swap to a free value
+    reversed_edges = [[] for _ in range(n)]
+    for v in range(n):
+        for w in edges[v]:
+            reversed_edges[w].append(v)
+    toFree = [False] * n
+    stack = [v for v in range(n) if free[v]]
+    for v in stack: toFree[v] = True
+    while stack:
+        w = stack.pop()
+        for v in reversed_edges[w]:
+            if not toFree[v]:
+                toFree[v] = True
+                stack.append(v)
+
+    changed = False
+    for v in range(n):
+        mask = masks[unit[v]]
+        for value in domains[v]:
+            if value == match[v]: continue
+            w = owner.get(value)
+            if w is None:
+                continue                    # a free value can always replace the matched one
+            if component[w] != component[v] and not toFree[w]:
+                mask &= ~(1 << value)
+        if mask != masks[unit[v]]:
+            masks[unit[v]] = mask
+            changed = True
+    return changed
+
+
+def _components(edges: List[List[int]]) -> List[int]:
+    """ Returns the strongly connected component of every node of the directed graph edges (Tarjan, iterative). """
+    n = len(edges)
+    index = [-1] * n
+    low = [0] * n
+    onStack = [False] * n
+    component = [-1] * n
+    stack: List[int] = []
+    counter = components = 0
+    for root in range(n):
+        if index[root] >= 0: continue
+        work = [(root, 0)]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        onStack[root] = True
+        while work:
+            v, k = work[-1]
+            if k < len(edges[v]):
+                work[-1] = (v, k + 1)
+                w = edges[v][k]
+                if index[w] < 0:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    onStack[w] = True
+                    work.append((w, 0))
+                elif onStack[w]:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[v])
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        onStack[w] = False
+                        component[w] = components
+                        if w == v: break
+                    components += 1
+    return component
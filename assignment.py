@@ -0,0 +1,108 @@
+""" Compact assignments for the search.
+    An assignment is one fixed-size array of value ids (see `CSP.ConstraintGraph`), indexed by variable id, with
+    UNASSIGNED for the free variables: 4 bytes per variable whatever the depth of the search, instead of a dict
+    entry per assigned variable. Both classes are mappings from variables to values, so they are used like the
+    dicts of the rest of the code, and the search and heuristics read the array directly with `assignedIds`.
+"""
+from array import array
+from collections.abc import Mapping, MutableMapping
+from typing import Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from CSP import ConstraintGraph, Variable, Value
+
+UNASSIGNED = -1
+
+
+class AssignmentView(Mapping):
+    """ A read-only assignment of the variables of graph, with size assigned variables in the array ids.
+        Solutions are returned as views: a copy of the array and a reference to the shared graph.
+        Views are pickled as plain dicts, since variables are not shared across processes.
+    """
+    __slots__ = ('graph', 'ids', 'size')
+
+    def __init__(self, graph: 'ConstraintGraph', ids: array, size: int):
+        self.graph = graph
+        self.ids = ids
+        self.size = size
+
+    def __getitem__(self, var: 'Variable') -> 'Value':
+        k = self.ids[self.graph.index[var]]
+        if k < 0:
+            raise KeyError(var)
+        return self.graph.values[k]
+
+    def get(self, var: 'Variable', default=None):
+        i = self.graph.index.get(var)
+        if i is None:
+            return default
+        k = self.ids[i]
+        return default if k < 0 else self.graph.values[k]
+
+    def __contains__(self, var) -> bool:
+        i = self.graph.index.get(var)
+        return i is not None and self.ids[i] >= 0
+
+    def __iter__(self):
+        variables = self.graph.variables
+        return (variables[i] for i, k in enumerate(self.ids) if k >= 0)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def copy(self) -> 'AssignmentView':
+        """ Returns a read-only snapshot of this assignment. """
+        return AssignmentView(self.graph, self.ids[:], self.size)
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+
+class Assignment(AssignmentView, MutableMapping):
+    """ The live assignment of a search, starting from initial. `Assignment::copy` returns a read-only view. """
+    __slots__ = ()
+
+    def __init__(self, graph: 'ConstraintGraph', initial: Mapping = {}):
+        super().__init__(graph, array('i', [UNASSIGNED]) * len(graph), 0)
+        for var, value in initial.items():
+            self[var] = value
+
+    def __setitem__(self, var: 'Variable', value: 'Value'):
+        i = self.graph.index[var]
+        if self.ids[i] < 0:
+            self.size += 1
+        self.ids[i] = self.graph.valueIndex[value]
+
+    def __delitem__(self, var: 'Variable'):
+        i = self.graph.index[var]
+        if self.ids[i] < 0:
+            raise KeyError(var)
+        self.ids[i] = UNASSIGNED
+        self.size -= 1
+
+    def pop(self, var: 'Variable', *default):
+        i = self.graph.index.get(var)
+        if i is None or self.ids[i] < 0:
+            if default:
+                return default[0]
+            raise KeyError(var)
+        k = self.ids[i]
+        self.ids[i] = UNASSIGNED
+        self.size -= 1
+        return self.graph.values[k]
+
+
+def assignedIds(graph: 'ConstraintGraph', assignment: Mapping) -> Sequence[int]:
+    """ Returns the value id of every variable of graph in assignment, indexed by variable id, or UNASSIGNED.
+        This is the array of an assignment of graph itself (live, not a copy), and a new array for other mappings.
+    """
+    if isinstance(assignment, AssignmentView) and assignment.graph is graph:
+        return assignment.ids
+    ids = array('i', [UNASSIGNED]) * len(graph)
+    index, valueIndex = graph.index, graph.valueIndex
+    for var, value in assignment.items():
+        ids[index[var]] = valueIndex[value]
+    return ids
@@ -0,0 +1,118 @@
+""" Batch solving of Sudoku puzzles, streamed from a file and solved by a pool of processes. """
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, Optional, TextIO, Tuple
+
+from cache import SolutionCache, solveCached
+from stats import SearchStats
+from Sudoku import Sudoku
+
+
+def readPuzzles(file: TextIO) -> Iterator[str]:
+    """ Yields the puzzles in file one by one, as lines of 81 characters with '0' for empty cells.
+        Reads both the 9 line grids of `puzzles/*.txt` (grids may follow each other, separated by
+        blank lines) and the common format of one puzzle of 81 characters per line.
+        Lines starting with '#' are ignored.
+    """
+    rows = []
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        line = line.replace('.', '0')
+        if len(line) == 81 and not rows:
+            yield line
+            continue
+        if len(line) != 9:
+            raise ValueError(f"Line {number}: expected a row of 9 cells or a puzzle of 81 cells")
+        rows.append(line)
+        if len(rows) == 9:
+            yield "".join(rows)
+            rows = []
+    if rows:
+        raise ValueError("Incomplete puzzle at the end of the file")
+
+
+_csp: Optional[Sudoku] = None
+_method: Optional[str] = None
+_options: Dict = dict()
+_cache: Optional[SolutionCache] = None
+
+
+def _initWorker(method: str, options: Dict, cacheSize: int = 0, cachePath: Optional[str] = None):
+    """ Builds the Sudoku (and its constraint graph) and the solution cache, if any, once per worker process. """
+    global _csp, _method, _options, _cache
+    _csp, _method, _options = Sudoku(), method, options
+    _csp.graph
+    if cacheSize or cachePath:
+        _cache = SolutionCache(cacheSize or 10000, cachePath)
+
+
+def _solvePuzzle(task: Tuple[int, str]) -> Dict:
+    """ Solves one puzzle in a worker process and returns its result record. """
+    index, puzzle = task
+    csp = _csp
+    if _cache is not None:
+        stats = solveCached(csp, puzzle, _method, _cache, stats=SearchStats(memory=True), **_options)
+    else:
+        stats = csp.solve(_method, csp.parseLine(puzzle), stats=SearchStats(memory=True), **_options)
+    record = {
+        "index": index,
+        "puzzle": puzzle,
+        "solution": csp.assignmentToLine(stats.solution) if stats.solution else None,
+    }
+    record.update(stats.asDict())
+    if _cache is not None:
+        record["cached"] = stats.cached
+    return record
+
+
+def solveBatch(puzzles: Iterator[str], output: TextIO, method: str, workers: int, options: Dict = dict(),
+               window: Optional[int] = None, cacheSize: int = 0, cachePath: Optional[str] = None) -> Dict:
+    """ Solves the puzzles with a pool of `workers` processes and writes one JSON record per puzzle
+        to output as soon as it is solved, so records are not in input order.
+        At most window puzzles (by default 4 per worker) are read ahead, so memory stays bounded
+        however large the input is.
+        With a cacheSize or cachePath, every worker keeps a `cache.SolutionCache` of that size (by default 10000),
+        persisted in and shared through the sqlite database at cachePath if given, and the records say whether
+        the solution was cached.
+        :return: summary statistics of the batch, with the largest peak RSS of a worker during a solve (to size the
+            pool by), and the cache hits and hit rate if there is a cache.
+    """
+    window = window or 4 * workers
+    solved = total = cached = 0
+    peak = None
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(method, options, cacheSize, cachePath)) as pool:
+        pending = set()
+        tasks = enumerate(puzzles)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(_solvePuzzle, task))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                output.write(json.dumps(record) + "\n")
+                total += 1
+                solved += record["solution"] is not None
+                cached += record.get("cached", False)
+                rss = record.get("peakRss")         # not measured for cache hits
+                if rss is not None and (peak is None or rss > peak): peak = rss
+    elapsed = time.perf_counter() - start
+    summary = {
+        "puzzles": total,
+        "solved": solved,
+        "workers": workers,
+        "time": elapsed,
+        "puzzlesPerSecond": total / elapsed if elapsed > 0 else 0.0,
+        "peakRss": peak,
+    }
+    if cacheSize or cachePath:
+        summary.update(cacheHits=cached, cacheHitRate=cached / total if total else 0.0)
+    return summary
@@ -0,0 +1,188 @@
+""" Reproducible benchmarks of the CSP solvers.
+    A benchmark runs a matrix of problems × methods in process, repeats every case with a range of seeds and
+    reports wall time, search nodes, backtracks and peak memory as JSON. A result file can be compared against
+    a stored baseline to find regressions.
+"""
+import json
+import os
+import platform
+import tracemalloc
+from typing import Dict, Iterable, List, Tuple
+
+from CSP import CSP, Variable, Value
+from NQueens import NQueens
+from stats import SearchStats
+from Sudoku import Sudoku
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def defaultProblems() -> List[str]:
+    """ Returns the problems of the default matrix: the NQueens sizes of the old scripts and `puzzles/*.txt`. """
+    puzzles = sorted(name for name in os.listdir(os.path.join(ROOT, "puzzles")) if name.endswith(".txt"))
+    return ["queens:10", "queens:30", "queens:50"] + [f"sudoku:puzzles/{name}" for name in puzzles]
+
+
+def makeProblem(problem: str) -> Tuple[CSP, Dict[Variable, Value]]:
+    """ Builds the CSP and its initial assignment for a problem name:
+        "queens:<n>" for the N Queens problem or "sudoku:<path>" for a Sudoku puzzle file.
+        Relative paths that do not exist are looked up from the repository, so "sudoku:puzzles/hard.txt" works anywhere.
+    """
+    kind, _, argument = problem.partition(":")
+    if kind == "queens":
+        return NQueens(int(argument)), dict()
+    elif kind == "sudoku":
+        if not os.path.exists(argument):
+            argument = os.path.join(ROOT, argument)
+        return Sudoku.fromFile(argument)
+    raise ValueError(f"Unknown problem '{problem}', expected 'queens:<n>' or 'sudoku:<path>'.")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """ Returns the q-th percentile (0 <= q <= 100) of values, interpolating linearly between ranks. """
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """ Returns the minimum, mean, median, 90th and 99th percentile and maximum of values. """
+    return {
+        "min": min(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def methodOptions(method: str, bitset: bool = False, propagation: str = "ac3", backjumping: bool = False,
+                  nogoods: int = 0) -> Dict:
+    """ Returns the options of `CSP::solve` that apply to method.
+        Backjumping and nogoods are only added when set, so the cases without them keep their keys.
+    """
+    if method in ("minconflicts", "dlx"):
+        return dict()
+    if method == "ac3":
+        return dict(bitset=bitset, propagation=propagation)
+    options = dict(bitset=bitset)
+    if backjumping: options["backjumping"] = True
+    if nogoods: options["nogoods"] = nogoods
+    return options
+
+
+def runOnce(problem: str, method: str, seed: int, options: Dict, memory: bool = False) -> Dict:
+    """ Solves problem once with method, with the variables in the order given by seed.
+        The run record holds the `SearchStats` of the solve; min-conflicts has no backtracks.
+        If memory is set, the peak memory of the solve is traced as well, which slows it down.
+    """
+    csp, initialAssignment = makeProblem(problem)
+    if method == "minconflicts":
+        options = dict(options, seed=seed)
+    else:
+        csp.compileGraph(seed)
+    if memory:
+        tracemalloc.start()
+    stats = csp.solve(method, initialAssignment, stats=SearchStats(memory=True), **options)
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    run = {
+        "seed": seed,
+        "solved": stats.solved,
+        "valid": stats.solved and csp.isValid(stats.solution),
+    }
+    run.update(stats.asDict())
+    if method == "minconflicts":
+        run["backtracks"] = None
+    run["peakMemory"] = peak
+    return run
+
+
+def caseKey(case: Dict) -> str:
+    """ Identifies a case across result files. """
+    options = ",".join(f"{key}={value}" for key, value in sorted(case["options"].items()))
+    return f"{case['problem']} {case['method']} {options}".rstrip()
+
+
+def runCase(problem: str, method: str, options: Dict, repeat: int, seed: int, memory: bool = True) -> Dict:
+    """ Runs one case of the matrix with the seeds seed, seed + 1, ..., seed + repeat - 1.
+        Timings are taken without tracing memory; the peak memory is measured in one extra traced run, and the peak
+        RSS is the largest of the runs.
+    """
+    runs = [runOnce(problem, method, seed + k, options) for k in range(repeat)]
+    case = {
+        "problem": problem,
+        "method": method,
+        "options": options,
+        "repeat": repeat,
+        "seed": seed,
+        "solved": sum(run["solved"] for run in runs),
+        "valid": all(run["valid"] for run in runs if run["solved"]),
+        "time": summarize([run["time"] for run in runs]),
+        "nodes": summarize([run["nodes"] for run in runs]),
+        "backtracks": summarize([run["backtracks"] for run in runs]) if method != "minconflicts" else None,
+        "peakMemory": runOnce(problem, method, seed, options, memory=True)["peakMemory"] if memory else None,
+        "peakRss": max((run["peakRss"] for run in runs if run["peakRss"] is not None), default=None),
+        "runs": runs,
+    }
+    case["key"] = caseKey(case)
+    return case
+
+
+def runBenchmark(problems: Iterable[str], methods: Iterable[str], bitset: bool = False, propagation: str = "ac3",
+                 repeat: int = 5, seed: int = 0, memory: bool = True, progress=None, backjumping: bool = False,
+                 nogoods: int = 0) -> Dict:
+    """ Runs every problem with every method and returns the results as a JSON serializable dict.
+        progress, if given, is called with every finished case.
+    """
+    cases = []
+    for problem in problems:
+        for method in methods:
+            case = runCase(problem, method, methodOptions(method, bitset, propagation, backjumping, nogoods), repeat, seed, memory)
+            cases.append(case)
+            if progress is not None:
+                progress(case)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": cases,
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float = 0.1) -> List[str]:
+    """ Compares results to baseline and returns a description of every regression: a case whose median time,
+        median nodes or peak memory grew by more than tolerance (a fraction), or that solved fewer runs.
+        Cases that are missing from either file are skipped.
+    """
+    previous = {case["key"]: case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        old = previous.get(case["key"])
+        if old is None:
+            continue
+        if case["solved"] < old["solved"]:
+            regressions.append(f"{case['key']}: solved {case['solved']}/{case['repeat']}, was {old['solved']}/{old['repeat']}")
+        for metric, new_value, old_value in (("time p50", case["time"]["p50"], old["time"]["p50"]),
+                                             ("nodes p50", case["nodes"]["p50"], old["nodes"]["p50"]),
+                                             ("peak memory", case["peakMemory"], old["peakMemory"])):
+            if new_value is None or old_value is None:
+                continue
+            if new_value > old_value * (1 + tolerance):
+                regressions.append(f"{case['key']}: {metric} {new_value:.4g}, was {old_value:.4g} "
+                                   f"(+{(new_value / old_value - 1) * 100 if old_value else float('inf'):.0f}%)")
+    return regressions
+
+
+def writeResults(results: Dict, path: str):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def readResults(path: str) -> Dict:
+    with open(path) as file:
+        return json.load(file)
@@ -0,0 +1,250 @@
+""" A solution cache for Sudoku puzzles that are the same up to symmetry.
+    Puzzles are reduced to a canonical form: the lexicographically smallest line of 81 characters over
+    transposition, permutations of the bands and of the rows within a band, permutations of the stacks and
+    of the columns within a stack, and relabeling of the digits. Equivalent puzzles share one cache entry,
+    and a cached solution is mapped back to the orientation and digits of the puzzle that is asked for.
+"""
+import sqlite3
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import permutations, product
+from typing import Dict, List, Optional, Tuple
+
+from stats import SearchStats, SOLVED, UNSATISFIABLE
+
+# every column order that keeps the stacks together: the stacks in some order, and the columns of each in some order
+COLUMN_ORDERS: List[Tuple[int, ...]] = [
+    tuple(3 * stack + col for stack, cols in zip(stacks, within) for col in cols)
+    for stacks in permutations(range(3))
+    for within in product(permutations(range(3)), repeat=3)
+]
+
+MAX_CANDIDATES = 4096       # partial transforms kept per row while canonicalizing
+
+
+class Transform:
+    """ Maps a puzzle to its canonical form: the canonical grid has row i of the (transposed, if transpose is set)
+        puzzle's row rows[i], column j its column cols[j], and digit labels[d] where the puzzle has digit d.
+    """
+    __slots__ = ('transpose', 'rows', 'cols', 'labels')
+
+    def __init__(self, transpose: bool, rows: Tuple[int, ...], cols: Tuple[int, ...], labels: List[int]):
+        self.transpose = transpose
+        self.rows = rows
+        self.cols = cols
+        self.labels = labels
+
+    def apply(self, grid: List[int]) -> List[int]:
+        """ Returns the canonical form of grid (81 digits, 0 for empty cells). """
+        if self.transpose: grid = transposed(grid)
+        labels = self.labels
+        return [labels[grid[9 * row + col]] for row in self.rows for col in self.cols]
+
+    def invert(self, grid: List[int]) -> List[int]:
+        """ Maps a grid in canonical form back to the puzzle's orientation and digits. """
+        digits = [0] * 10
+        for digit, label in enumerate(self.labels):
+            digits[label] = digit
+        original = [0] * 81
+        for i, row in enumerate(self.rows):
+            for j, col in enumerate(self.cols):
+                original[9 * row + col] = digits[grid[9 * i + j]]
+        return transposed(original) if self.transpose else original
+
+
+def parseGrid(line: str) -> List[int]:
+    """ Returns the digits of a puzzle line of 81 characters, with 0 for the empty cells ('0' or '.'). """
+    line = line.strip()
+    if len(line) != 81:
+        raise ValueError("A sudoku line needs 81 cells")
+    return [0 if char == '.' else int(char) for char in line]
+
+
+def transposed(grid: List[int]) -> List[int]:
+    return [grid[9 * col + row] for row in range(9) for col in range(9)]
+
+
+def _relabel(values, labels: List[int], nextLabel: int) -> Tuple[Tuple[int, ...], List[int], int]:
+    """ Relabels values, giving digits that have no label yet the next labels in order of appearance. """
+    relabeled = []
+    for value in values:
+        if value and not labels[value]:
+            labels = list(labels)
+            labels[value] = nextLabel
+            nextLabel += 1
+        relabeled.append(labels[value])
+    return tuple(relabeled), labels, nextLabel
+
+
+@lru_cache(maxsize=512)
+def _smallestOrders(mask: int) -> Tuple[Tuple[int, ...], Tuple[Tuple[int, ...], ...]]:
+    """ Returns the smallest pattern (1 for a given, 0 for an empty cell) a row with the givens of mask (a bit per
+        column) can get by a column order, and the column orders that give it.
+    """
+    best, orders = None, []
+    for cols in COLUMN_ORDERS:
+        pattern = tuple(mask >> col & 1 for col in cols)
+        if best is None or pattern < best:
+            best, orders = pattern, []
+        if pattern == best:
+            orders.append(cols)
+    return best, tuple(orders)
+
+
+def canonicalForm(grid: List[int]) -> Tuple[str, Transform]:
+    """ Returns the canonical line of the puzzle grid and the transform that maps the puzzle to it.
+        The canonical form is built row by row, keeping every partial transform (transposition, rows so far,
+        column order and digit labels) that gives the smallest rows so far. Puzzles with many symmetries,
+        e.g. with several empty rows, can have more than MAX_CANDIDATES of them; only the first are kept then, so
+        such a puzzle and an equivalent one may get different forms, which only costs a cache miss.
+    """
+    # row 0: any row of the grid or its transpose, and any column order. Its digits get the labels 1, 2, ... in
+    # order, so the relabeled row only depends on where its givens are, and the smallest is the smallest pattern
+    best, starts = None, []
+    for transpose in (False, True):
+        rows = [tuple(row) for row in _rows(transposed(grid) if transpose else grid)]
+        for row in range(9):
+            pattern, orders = _smallestOrders(sum(1 << col for col in range(9) if rows[row][col]))
+            if best is None or pattern < best:
+                best, starts = pattern, []
+            if pattern == best:
+                starts.append((rows, row, orders, transpose))
+    candidates = []
+    for rows, row, orders, transpose in starts:
+        for cols in orders[:MAX_CANDIDATES - len(candidates)]:
+            relabeled, labels, nextLabel = _relabel([rows[row][col] for col in cols], [0] * 10, 1)
+            candidates.append((rows, (row,), cols, labels, nextLabel, transpose))
+    canonical = list(relabeled)
+
+    # rows 1 to 8: the next row of the band, or the first row of another band
+    for i in range(1, 9):
+        best, extended = None, []
+        for rows, chosen, cols, labels, nextLabel, transpose in candidates:
+            if i % 3:
+                band = chosen[-1] // 3
+                options = [row for row in range(3 * band, 3 * band + 3) if row not in chosen]
+            else:
+                used = {row // 3 for row in chosen}
+                options = [row for row in range(9) if row // 3 not in used]
+            for row in options:
+                relabeled, new_labels, new_next = _relabel([rows[row][col] for col in cols], labels, nextLabel)
+                if best is None or relabeled < best:
+                    best, extended = relabeled, []
+                if relabeled == best and len(extended) < MAX_CANDIDATES:
+                    extended.append((rows, chosen + (row,), cols, new_labels, new_next, transpose))
+        candidates = extended
+        canonical.extend(best)
+
+    _, chosen, cols, labels, nextLabel, transpose = candidates[0]
+    # digits that are not in the puzzle get the remaining labels, so the transform is a bijection on the digits
+    for digit in range(1, 10):
+        if not labels[digit]:
+            labels[digit] = nextLabel
+            nextLabel += 1
+    return "".join(map(str, canonical)), Transform(transpose, chosen, cols, labels)
+
+
+def _rows(grid: List[int]) -> List[List[int]]:
+    return [grid[9 * row:9 * row + 9] for row in range(9)]
+
+
+class SolutionCache:
+    """ An LRU cache of Sudoku solutions keyed by the canonical form of the puzzle, holding at most capacity
+        solutions in memory. With a path, solutions are also stored in a sqlite database there, which is looked up
+        on a miss in memory, so the cache survives the process and can be shared between processes.
+        A puzzle without a solution is cached as well, with an empty solution.
+    """
+    def __init__(self, capacity: int = 10000, path: Optional[str] = None):
+        self.capacity = capacity
+        self.entries: 'OrderedDict[str, str]' = OrderedDict()
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS solutions (puzzle TEXT PRIMARY KEY, solution TEXT NOT NULL)")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def hitRate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: str) -> Optional[str]:
+        """ Returns the cached solution line of the canonical puzzle key ('' if it has none), or None on a miss. """
+        solution = self.entries.get(key)
+        if solution is not None:
+            self.entries.move_to_end(key)
+        elif self.db is not None:
+            row = self.db.execute("SELECT solution FROM solutions WHERE puzzle = ?", (key,)).fetchone()
+            if row is not None:
+                solution = row[0]
+                self.diskHits += 1
+                self._remember(key, solution)
+        if solution is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return solution
+
+    def put(self, key: str, solution: str):
+        self._remember(key, solution)
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?)", (key, solution))
+
+    def _remember(self, key: str, solution: str):
+        self.entries[key] = solution
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def metrics(self) -> Dict:
+        """ Returns the hit rate and counters of the cache as a JSON serializable dict. """
+        return {
+            "hits": self.hits,
+            "diskHits": self.diskHits,
+            "misses": self.misses,
+            "hitRate": self.hitRate,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+        }
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def solveCached(csp, line: str, method: str, cache: SolutionCache, **options) -> SearchStats:
+    """ Solves the puzzle line with csp (a `Sudoku`), looking its canonical form up in cache first.
+        On a miss, the canonical puzzle is solved with method and options (see `CSP::solve`) and its solution is
+        cached; either way the solution is mapped back to the puzzle. A cached solution is checked against the
+        givens of the puzzle before it is used. The returned stats have `SearchStats::cached` set on a hit.
+        A solve that timed out or was stopped proves nothing, so it is not cached.
+    """
+    grid = parseGrid(line)
+    key, transform = canonicalForm(grid)
+    solution = cache.get(key)
+    if solution is not None:
+        stats = SearchStats()
+        stats.cached = True
+        stats.status = SOLVED if solution else UNSATISFIABLE
+    else:
+        stats = csp.solve(method, csp.parseLine(key), **options)
+        solution = csp.assignmentToLine(stats.solution) if stats.solution is not None else ""
+        if stats.status in (SOLVED, UNSATISFIABLE):
+            cache.put(key, solution)
+    if solution:
+        original = transform.invert([int(char) for char in solution])
+        if any(given and given != value for given, value in zip(grid, original)):
+            raise RuntimeError(f"The cached solution of {key} does not match the puzzle {line.strip()}")
+        stats.solution = csp.parseLine("".join(map(str, original)))
+    else:
+        stats.solution = None
+    return stats
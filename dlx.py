@@ -0,0 +1,135 @@
+""" Algorithm X with dancing links (Knuth) for exact cover problems, such as Sudoku and N Queens.
+    An exact cover problem has columns (the constraints) and rows (the choices), every row covering some of the
+    columns; a solution is a set of rows that covers every primary column exactly once and every secondary column
+    at most once. The 1 entries of the matrix are nodes in circular doubly linked lists, one per row and one per
+    column, so covering a column (taking it and every row that meets it out of the matrix) and uncovering it again
+    are a few pointer updates per node, and the search always branches on the primary column with the fewest rows.
+"""
+from typing import Callable, Iterator, List, Optional, Sequence
+
+from stats import SearchStats
+
+
+def exactCovers(primary: int, secondary: int, rows: Sequence[Sequence[int]], initial: Sequence[int] = (),
+                stats: Optional[SearchStats] = None,
+                stopCondition: Optional[Callable[[], bool]] = None) -> Iterator[List[int]]:
+    """ Yields every exact cover that contains the rows initial, of the matrix with primary columns 0 to primary - 1,
+        secondary columns primary to primary + secondary - 1 and the given rows (lists of columns), as the live list
+        of the numbers of its rows, which changes when the search continues.
+        Every partial cover counts as a search node of stats, every dead end and exhausted column as a backtrack.
+        The search stops at the first node where stopCondition returns True.
+    """
+    stats = stats if stats is not None else SearchStats()
+    # node 0 is the root, 1 to columns the column headers, then the nodes of the rows
+    heads = primary + secondary + 1
+    left = [c - 1 for c in range(heads)]
+    right = [c + 1 for c in range(heads)]
+    left[0], right[primary] = primary, 0
+    for c in range(primary + 1, heads):     # secondary columns are not in the root's list, so never chosen
+        left[c] = right[c] = c
+    up, down, column = list(range(heads)), list(range(heads)), list(range(heads))
+    size = [0] * heads
+    rowOf = [-1] * heads
+    rowNode = []
+    for r, row in enumerate(rows):
+        first = len(left)
+        rowNode.append(first if row else None)
+        for k, col in enumerate(row):
+            c, node = col + 1, first + k
+            left.append(node - 1 if k else first + len(row) - 1)
+            right.append(node + 1 if k < len(row) - 1 else first)
+            up.append(up[c])
+            down.append(c)
+            down[up[c]] = node
+            up[c] = node
+            column.append(c)
+            size[c] += 1
+            rowOf.append(r)
+
+    def cover(c: int):
+        left[right[c]], right[left[c]] = left[c], right[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                up[down[j]], down[up[j]] = up[j], down[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(c: int):
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                up[down[j]] = down[up[j]] = j
+                j = left[j]
+            i = up[i]
+        left[right[c]] = right[left[c]] = c
+
+    chosen: List[int] = []
+    covered = [False] * heads
+    for r in initial:
+        node = rowNode[r]
+        if node is None:
+            continue
+        j = node
+        while True:
+            c = column[j]
+            if covered[c]:                  # two initial rows share a column
+                return
+            covered[c] = True
+            cover(c)
+            j = right[j]
+            if j == node: break
+        chosen.append(r)
+
+    nodes: List[int] = []                   # the node of the row chosen at every level
+    while True:
+        stats.nodes += 1
+        if stats.nodes == stats.nextSample: stats.sampled()
+        if len(nodes) > stats.maxDepth: stats.maxDepth = len(nodes)
+        if stopCondition is not None and stopCondition():
+            return
+        c = right[0]
+        if c == 0:
+            yield chosen
+        else:
+            best, j = size[c], right[c]
+            while j and best > 1:
+                if size[j] < best: c, best = j, size[j]
+                j = right[j]
+            if best:
+                cover(c)
+                r = down[c]
+                nodes.append(r)
+                chosen.append(rowOf[r])
+                j = right[r]
+                while j != r:
+                    cover(column[j])
+                    j = right[j]
+                continue
+            stats.backtracks += 1
+        # go on with the next row of the deepest column that has one left
+        while nodes:
+            r = nodes.pop()
+            chosen.pop()
+            j = left[r]
+            while j != r:
+                uncover(column[j])
+                j = left[j]
+            r = down[r]
+            c = column[r]
+            if r != c:
+                nodes.append(r)
+                chosen.append(rowOf[r])
+                j = right[r]
+                while j != r:
+                    cover(column[j])
+                    j = right[j]
+                break
+            uncover(c)
+            stats.backtracks += 1
+        else:
+            return
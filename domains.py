@@ -0,0 +1,118 @@
+""" Bitset domain store for the CSP solvers. """
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from CSP import ConstraintGraph, Variable, Value
+
+
+def iterBits(mask: int) -> Iterator[int]:
+    """ Yields the positions of the set bits in mask, lowest first. """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+@lru_cache(maxsize=1 << 16)
+def bitList(mask: int) -> Tuple[int, ...]:
+    """ Returns the positions of the set bits in mask, lowest first.
+        Cached: the solvers keep decoding the same domain masks.
+    """
+    return tuple(iterBits(mask))
+
+
+class BitDomains:
+    """ Domains of all variables of a CSP, stored as one integer bitmask per variable.
+        Bit k of `masks[i]` is set when `graph.values[k]` is still in the domain of `graph.variables[i]`.
+        Pruning, emptiness checks and domain sizes are single integer operations, and copying the
+        store only copies a list of ints.
+        It can be read like the `Dict[Variable, Set[Value]]` domains used by the rest of `CSP`.
+
+        A trailing store (`trail` is not None) is pruned in place instead of being copied: every
+        change is recorded on the trail as (variable id, old mask), and `undo` restores the state
+        of an earlier `mark` on backtrack. Memory per search node is then O(changes).
+    """
+    __slots__ = ('graph', 'masks', 'trail')
+
+    def __init__(self, graph: 'ConstraintGraph', masks: List[int], trail: Optional[List[Tuple[int, int]]] = None):
+        self.graph = graph
+        self.masks = masks
+        self.trail = trail
+
+    @classmethod
+    def fromAssignment(cls, graph: 'ConstraintGraph', assignment: Dict['Variable', 'Value'], trail: bool = False) -> 'BitDomains':
+        """ Fills in the initial domains for each variable.
+            Already assigned variables only contain the given value in their domain.
+        """
+        masks = list(graph.startMasks)
+        for var, val in assignment.items():
+            masks[graph.index[var]] = 1 << graph.valueIndex[val]
+        return cls(graph, masks, [] if trail else None)
+
+    def copy(self) -> 'BitDomains':
+        """ Returns a non-trailing snapshot of this store. """
+        return BitDomains(self.graph, list(self.masks))
+
+    def prune(self, i: int, mask: int):
+        """ Sets the domain of the variable with id i to mask, recording the old mask on the trail. """
+        old = self.masks[i]
+        if mask != old:
+            if self.trail is not None:
+                self.trail.append((i, old))
+            self.masks[i] = mask
+
+    def mark(self) -> int:
+        """ Returns the current trail position, to be passed to `BitDomains::undo`. """
+        return len(self.trail)
+
+    def undo(self, mark: int):
+        """ Restores all domains pruned since mark was taken. """
+        trail, masks = self.trail, self.masks
+        while len(trail) > mark:
+            i, old = trail.pop()
+            masks[i] = old
+
+    def size(self, i: int) -> int:
+        """ Returns the number of values left in the domain of the variable with id i. """
+        return self.masks[i].bit_count()
+
+    def decode(self, mask: int) -> Set['Value']:
+        """ Returns the set of values encoded by mask. """
+        values = self.graph.values
+        return {values[k] for k in iterBits(mask)}
+
+    def __getitem__(self, var: 'Variable') -> Set['Value']:
+        return self.decode(self.masks[self.graph.index[var]])
+
+    def get(self, var: 'Variable', default=None):
+        i = self.graph.index.get(var)
+        return default if i is None else self.decode(self.masks[i])
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def __iter__(self) -> Iterator['Variable']:
+        return iter(self.graph.variables)
+
+    def keys(self) -> List['Variable']:
+        return list(self.graph.variables)
+
+    def values(self) -> List[Set['Value']]:
+        return [self.decode(mask) for mask in self.masks]
+
+    def items(self) -> List[Tuple['Variable', Set['Value']]]:
+        return list(zip(self.graph.variables, self.values()))
+
+
+def markDomains(domains) -> Optional[int]:
+    """ Returns an undo mark for domains, or None when domains are copied instead of trailed. """
+    if isinstance(domains, BitDomains) and domains.trail is not None:
+        return len(domains.trail)
+    return None
+
+
+def undoDomains(domains, mark: Optional[int]):
+    """ Undoes all prunings of domains since mark (see `markDomains`). """
+    if mark is not None:
+        domains.undo(mark)
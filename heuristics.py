@@ -0,0 +1,197 @@
+""" Variable and value ordering strategies for the CSP solvers.
+    Ties are broken deterministically, unless the CSP has a random generator in `CSP::rng`, which then picks
+    among the tied variables or values, so seeded runs differ from each other but are reproducible.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, List, Set, TYPE_CHECKING
+
+from assignment import assignedIds
+from domains import BitDomains, bitList
+
+if TYPE_CHECKING:
+    from CSP import CSP, Variable, Value
+
+
+def domainSizes(csp: 'CSP', domains) -> List[int]:
+    """ Returns the domain size of every variable, indexed by variable id. """
+    if isinstance(domains, BitDomains):
+        return [mask.bit_count() for mask in domains.masks]
+    return [len(domains[var]) for var in csp.graph.variables]
+
+
+class VariableOrder(ABC):
+    """ Strategy used by `CSP::selectVariable`. """
+    @abstractmethod
+    def select(self, csp: 'CSP', assignment: Dict['Variable', 'Value'], domains) -> 'Variable':
+        """ Returns the next variable to assign. """
+        pass
+
+    def reset(self):
+        """ Called at the start of every solve. """
+        pass
+
+    def propagated(self, csp: 'CSP', assignment: Dict['Variable', 'Value'], domains, var: 'Variable'):
+        """ Called after the search assigned var and propagated the assignment into domains. """
+        pass
+
+
+class StaticOrder(VariableOrder):
+    """ Assigns the variables in the order of the constraint graph. """
+    def select(self, csp, assignment, domains):
+        ids = assignedIds(csp.graph, assignment)
+        for i, var in enumerate(csp.graph.variables):
+            if ids[i] < 0:
+                return var
+
+
+class MinimumRemainingValues(VariableOrder):
+    """ Picks the variable with the smallest domain (MRV).
+        Ties are broken by the degree heuristic: the most constraints with unassigned variables, and then at
+        random if the CSP has a random generator.
+    """
+    def select(self, csp, assignment, domains):
+        graph = csp.graph
+        variables = graph.variables
+        ids = assignedIds(graph, assignment)
+        smallest_domain = float("inf")
+        candidates = []
+        for i, size in enumerate(domainSizes(csp, domains)):
+            if size > smallest_domain or ids[i] >= 0: continue
+            if size < smallest_domain:
+                smallest_domain, candidates = size, [i]
+            else:
+                candidates.append(i)
+        if len(candidates) <= 1:
+            return variables[candidates[0]] if candidates else None
+        degree = lambda i: sum(ids[j] < 0 for j in graph.neighbors[i])
+        if csp.rng is None:
+            return variables[max(candidates, key=degree)]
+        degrees = [degree(i) for i in candidates]
+        most = max(degrees)
+        return variables[csp.rng.choice([i for i, d in zip(candidates, degrees) if d == most])]
+
+
+class DomWDeg(VariableOrder):
+    """ Picks the variable with the smallest ratio of domain size to weighted degree (dom/wdeg).
+        Every constraint starts with weight 1, and its weight is increased each time forward checking
+        over it wipes out a domain, so the search focuses on the hard parts of the problem.
+        The weights are kept across restarts of the search; ties are broken at random if the CSP has a random
+        generator.
+    """
+    def __init__(self):
+        self.weights: Dict[tuple, int] = dict()
+
+    def reset(self):
+        self.weights.clear()
+
+    def select(self, csp, assignment, domains):
+        graph = csp.graph
+        variables, weights, rng = graph.variables, self.weights, csp.rng
+        ids = assignedIds(graph, assignment)
+        var_to_return, best, ties = None, float("inf"), 0
+        for i, size in enumerate(domainSizes(csp, domains)):
+            if ids[i] >= 0: continue
+            if size == 0: return variables[i]
+            wdeg = 0
+            for j in graph.neighbors[i]:
+                if ids[j] < 0:
+                    wdeg += weights.get((i, j) if i < j else (j, i), 1)
+            ratio = size / wdeg if wdeg else float("inf")
+            if ratio < best or var_to_return is None:
+                var_to_return, best, ties = variables[i], ratio, 1
+            elif ratio == best and rng is not None:
+                # reservoir sampling: every tied variable is picked with the same probability
+                ties += 1
+                if rng.randrange(ties) == 0: var_to_return = variables[i]
+        return var_to_return
+
+    def propagated(self, csp, assignment, domains, var):
+        graph = csp.graph
+        i = graph.index[var]
+        sizes = domainSizes(csp, domains)
+        for j in graph.neighbors[i]:
+            if sizes[j] == 0:
+                key = (i, j) if i < j else (j, i)
+                self.weights[key] = self.weights.get(key, 1) + 1
+
+
+class ValueOrder(ABC):
+    """ Strategy used by `CSP::orderDomain`. """
+    @abstractmethod
+    def order(self, csp: 'CSP', assignment: Dict['Variable', 'Value'], domains, var: 'Variable') -> List['Value']:
+        """ Returns the values of var in the order they should be tried. """
+        pass
+
+
+class StaticValueOrder(ValueOrder):
+    """ Tries the values in increasing order. """
+    def order(self, csp, assignment, domains, var):
+        if isinstance(domains, BitDomains):
+            values = csp.graph.values
+            return [values[k] for k in bitList(domains.masks[csp.graph.index[var]])]
+        return sortedValues(domains[var])
+
+
+class LeastConstrainingValue(ValueOrder):
+    """ Tries the values that rule out the fewest values of the unassigned neighbors first (LCV).
+        The number of conflicts of each value is counted directly over the neighbors of var,
+        without running forward checking or building new domains, with the compatibility tables if the
+        constraint graph has them.
+        Values with as many conflicts are in increasing order, or shuffled if the CSP has a random generator.
+    """
+    def order(self, csp, assignment, domains, var):
+        graph = csp.graph
+        isValidPairwise = csp.isValidPairwise
+        i = graph.index[var]
+        ids = assignedIds(graph, assignment)
+        neighbors = [j for j in graph.neighbors[i] if ids[j] < 0]
+        bits = isinstance(domains, BitDomains)
+        if bits:
+            values, masks = graph.values, domains.masks
+            own = [values[k] for k in bitList(masks[i])]
+        else:
+            own = sortedValues(domains[var])
+
+        conflicts = dict()
+        if graph.supports is not None:
+            # a value rules out the values of a neighbor that are not in its row of the compatibility table
+            valueIndex, tables = graph.valueIndex, graph.supports[i]
+            if not bits:
+                masks = {j: sum(1 << valueIndex[w] for w in domains[graph.variables[j]]) for j in neighbors}
+            for value in own:
+                k = valueIndex[value]
+                conflicts[value] = sum((masks[j] & ~tables[j][k]).bit_count() for j in neighbors)
+        else:
+            if bits:
+                neighbor_domains = [(graph.variables[j], [values[k] for k in bitList(masks[j])]) for j in neighbors]
+            else:
+                neighbor_domains = [(graph.variables[j], domains[graph.variables[j]]) for j in neighbors]
+            for value in own:
+                count = 0
+                for neighbor, neighbor_domain in neighbor_domains:
+                    for neighbor_value in neighbor_domain:
+                        if not isValidPairwise(var, value, neighbor, neighbor_value):
+                            count += 1
+                conflicts[value] = count
+        if csp.rng is not None: csp.rng.shuffle(own)
+        return sorted(own, key=conflicts.get)
+
+
+def sortedValues(values: Set['Value']) -> List['Value']:
+    """ Returns values sorted if they can be ordered, in iteration order otherwise. """
+    try:
+        return sorted(values)
+    except TypeError:
+        return list(values)
+
+
+VARIABLE_ORDERS = {
+    "static": StaticOrder,
+    "mrv": MinimumRemainingValues,
+    "domwdeg": DomWDeg,
+}
+
+VALUE_ORDERS = {
+    "static": StaticValueOrder,
+    "lcv": LeastConstrainingValue,
+}
@@ -0,0 +1,158 @@
+""" Parallel search for a single CSP instance.
+    The search tree is split at its first decision levels into subproblems (an assignment plus its
+    propagated domains), which are solved by a pool of worker processes.
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from domains import BitDomains
+from heuristics import domainSizes
+from stats import SearchStats
+
+if TYPE_CHECKING:
+    from CSP import CSP, Variable, Value
+
+
+def propagate(csp: 'CSP', method: str, assignment: Dict['Variable', 'Value'], domains, variable: Optional['Variable'],
+              arcConsistency: Callable):
+    """ Propagates assignment into domains the way method does after assigning variable
+        (or after the initial assignment if variable is None).
+        domains must not be trailing, so they are copied and never modified in place.
+    """
+    if method == "bf":
+        return domains
+    domains = csp.forwardChecking(assignment, domains, variable)
+    if method == "ac3":
+        domains = arcConsistency(assignment, domains)
+    return domains
+
+
+def split(csp: 'CSP', method: str, assignment: Dict['Variable', 'Value'], domains, count: int,
+          arcConsistency: Callable) -> List[Tuple[Dict['Variable', 'Value'], object]]:
+    """ Expands the search tree breadth first until there are at least count open subproblems.
+        Subproblems in which propagation wiped out a domain are dropped, and a subproblem with a
+        complete assignment is returned on its own.
+    """
+    frontier = deque([(assignment, domains)])
+    while frontier and len(frontier) < count:
+        assignment, domains = frontier.popleft()
+        if csp.stats is not None: csp.stats.nodes += 1
+        if csp.isComplete(assignment):
+            return [(assignment, domains)]
+        checker = csp.consistencyChecker(assignment)
+        var = csp.selectVariable(assignment, domains)
+        for value in csp.orderDomain(assignment, domains, var):
+            if not checker.isConsistent(var, value):
+                continue
+            child = dict(assignment)
+            child[var] = value
+            child_domains = propagate(csp, method, child, domains, var, arcConsistency)
+            if 0 not in domainSizes(csp, child_domains):
+                frontier.append((child, child_domains))
+    return list(frontier)
+
+
+def encode(csp: 'CSP', assignment: Dict['Variable', 'Value'], domains) -> Tuple[list, list]:
+    """ Encodes a subproblem by variable ids, so it can be sent to another process. """
+    graph = csp.graph
+    encoded_assignment = [(graph.index[var], value) for var, value in assignment.items()]
+    if isinstance(domains, BitDomains):
+        return encoded_assignment, list(domains.masks)
+    return encoded_assignment, [domains[var] for var in graph.variables]
+
+
+_csp: Optional['CSP'] = None
+_method: Optional[str] = None
+_trail = True
+_arcConsistency: Optional[Callable] = None
+_timing = False
+_memory = False
+
+
+def _initWorker(csp: 'CSP', method: str, trail: bool, propagation: str, timing: bool, memory: bool, stop):
+    """ Keeps the CSP (with its compiled graph) of this worker process, and makes its search stop on stop. """
+    global _csp, _method, _trail, _arcConsistency, _timing, _memory
+    _csp, _method, _trail, _timing, _memory = csp, method, trail, timing, memory
+    _arcConsistency = csp.arcConsistency(propagation)
+    csp.stopCondition = stop.is_set
+
+
+def _solveSubproblem(task: Tuple[list, list]) -> Tuple[Optional[list], SearchStats]:
+    """ Solves one encoded subproblem in a worker process.
+        :return: the encoded solution (or None) and the statistics of the search.
+    """
+    encoded_assignment, encoded_domains = task
+    csp = _csp
+    graph = csp.graph
+    assignment = {graph.variables[i]: value for i, value in encoded_assignment}
+    if encoded_domains and isinstance(encoded_domains[0], int):
+        domains = BitDomains(graph, encoded_domains, [] if _trail else None)
+    else:
+        domains = dict(zip(graph.variables, encoded_domains))
+    stats = csp._search(_method, assignment, domains, _arcConsistency, SearchStats(timing=_timing, memory=_memory))
+    solution, stats.solution = stats.solution, None
+    if solution is None:
+        return None, stats
+    return [(graph.index[var], value) for var, value in solution.items()], stats
+
+
+def solveParallel(csp: 'CSP', method: str = "fc", initialAssignment: Dict['Variable', 'Value'] = dict(),
+                  jobs: Optional[int] = None, subproblems: Optional[int] = None, bitset: bool = False, trail: bool = True,
+                  propagation: str = "ac3", variableOrder: Optional[str] = None, valueOrder: Optional[str] = None,
+                  stats: Optional[SearchStats] = None) -> SearchStats:
+    """ Solves csp with method ("bf", "fc" or "ac3") on a pool of jobs worker processes.
+        The search tree is split into about subproblems subproblems (by default 8 per job). The pool
+        hands them out one at a time to whichever worker is idle, so a worker that finishes an easy
+        subtree early takes over the remaining work. As soon as one worker finds a solution, the
+        pending subproblems are cancelled and the running ones are told to stop.
+        The statistics of all finished subproblems are merged into the returned stats.
+        :return: the statistics of the search, with a complete and valid assignment in `SearchStats::solution`
+            if one exists, and SOLVED or UNSATISFIABLE in `SearchStats::status`.
+    """
+    if method not in ("bf", "fc", "ac3"):
+        raise ValueError(f"Method '{method}' cannot be solved in parallel.")
+    csp.checkInitialAssignment(initialAssignment)
+    stats = csp.startStats(stats)
+    with stats.measure(len(initialAssignment)), csp.budget(stats):
+        stats.solution = _solveParallel(csp, method, initialAssignment, jobs, subproblems, bitset, trail, propagation,
+                                        variableOrder, valueOrder)
+    return stats
+
+
+def _solveParallel(csp: 'CSP', method: str, initialAssignment: Dict['Variable', 'Value'], jobs: Optional[int],
+                   subproblems: Optional[int], bitset: bool, trail: bool, propagation: str, variableOrder: Optional[str],
+                   valueOrder: Optional[str]) -> Optional[Dict['Variable', 'Value']]:
+    """ The search of `solveParallel`, recording its statistics in csp.stats. """
+    jobs = jobs or os.cpu_count() or 1
+    subproblems = subproblems or 8 * jobs
+    csp.useStrategies(variableOrder, valueOrder)
+    arcConsistency = csp.arcConsistency(propagation)
+    if not csp.isValid(initialAssignment):
+        return None
+    domains = csp.initialDomains(initialAssignment, bitset, trail=False)
+    domains = propagate(csp, method, initialAssignment, domains, None, arcConsistency)
+    if 0 in domainSizes(csp, domains):
+        return None
+    tasks = split(csp, method, dict(initialAssignment), domains, subproblems, arcConsistency)
+    if len(tasks) == 1 and csp.isComplete(tasks[0][0]):
+        return tasks[0][0]
+
+    variables = csp.graph.variables
+    stop = multiprocessing.Event()
+    with ProcessPoolExecutor(jobs, initializer=_initWorker, initargs=(csp, method, trail, propagation, csp.stats.timing, csp.stats.memory, stop)) as pool:
+        futures = {pool.submit(_solveSubproblem, encode(csp, assignment, domains)): len(assignment) - len(initialAssignment)
+                   for assignment, domains in tasks}
+        try:
+            for future in as_completed(futures):
+                solution, subproblem_stats = future.result()
+                subproblem_stats.maxDepth += futures[future]
+                csp.stats.merge(subproblem_stats)
+                if solution is not None:
+                    return {variables[i]: value for i, value in solution}
+        finally:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+    return None
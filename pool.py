@@ -0,0 +1,112 @@
+""" An asyncio-friendly pool of solver processes.
+    Solves run in worker processes, so they do not block the event loop, and can be cancelled like any other
+    coroutine: a cancelled solve sets a flag in shared memory that the worker's search checks at every node,
+    so the worker stops within a node and is free for the next solve, without being killed.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from stats import SearchStats
+
+if TYPE_CHECKING:
+    from CSP import CSP, Variable, Value
+
+
+_flags = None                               # the cancel flag of every slot, shared by the pool's processes
+
+
+def _initWorker(flags):
+    global _flags
+    _flags = flags
+
+
+def _solveTask(slot: int, csp: 'CSP', method: str, assignment: List[Tuple[int, 'Value']],
+               options: Dict) -> Tuple[Optional[List[Tuple[int, 'Value']]], SearchStats]:
+    """ Solves csp in a worker process until it is done or the cancel flag of slot is set.
+        Assignments are passed as (variable id, value) pairs, since variables are not equal across processes.
+    """
+    variables = csp.graph.variables
+    csp.stopCondition = lambda: bool(_flags[slot])
+    initialAssignment = {variables[i]: value for i, value in assignment}
+    stats = csp.solve(method, initialAssignment, stats=SearchStats(memory=True), **options)
+    solution, stats.solution = stats.solution, None
+    if solution is None:
+        return None, stats
+    graph = csp.graph
+    return [(graph.index[var], value) for var, value in solution.items()], stats
+
+
+class SolverPool:
+    """ Runs `CSP::solve` in a pool of worker processes, as coroutines:
+
+            async with SolverPool(4) as pool:
+                stats = await asyncio.wait_for(pool.solve(sudoku, "fc", assignment, timeout=2.0), 1.0)
+
+        At most slots solves (by default 2 per worker) run or wait in the pool at a time, every one with its
+        own cancel flag; further solves wait for a free slot. Cancelling a solve that runs stops its search at
+        the next node, and `SolverPool::solve` raises `asyncio.CancelledError` right away, without waiting for
+        the worker. The stats and profile options of `CSP::solve` are not supported, the stats of a solve are
+        returned, with the peak RSS of its worker in `SearchStats::peakRss`.
+    """
+    def __init__(self, workers: Optional[int] = None, slots: Optional[int] = None):
+        workers = workers or multiprocessing.cpu_count()
+        slots = slots or 2 * workers
+        self.flags = multiprocessing.Array('b', slots, lock=False)
+        self.free = list(range(slots))
+        self.slots = asyncio.Semaphore(slots)
+        self.executor = ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(self.flags,))
+
+    async def __aenter__(self) -> 'SolverPool':
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Stops every running solve and shuts the worker processes down. """
+        for slot in range(len(self.flags)):
+            self.flags[slot] = 1
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def solve(self, csp: 'CSP', method: str = "fc", initialAssignment: Dict['Variable', 'Value'] = dict(),
+                    **options) -> SearchStats:
+        """ Solves csp with method and options (see `CSP::solve`) in a worker process.
+            The budget options (maxNodes and timeout) bound the search in the worker; cancelling the coroutine,
+            e.g. with `asyncio.wait_for`, stops it from the outside.
+            :return: the statistics of the solve, with the solution in `SearchStats::solution`.
+        """
+        loop = asyncio.get_running_loop()
+        graph = csp.graph
+        assignment = [(graph.index[var], value) for var, value in initialAssignment.items()]
+        await self.slots.acquire()
+        slot = self.free.pop()
+        try:
+            future = self.executor.submit(_solveTask, slot, csp, method, assignment, options)
+        except BaseException:
+            self._release(slot)
+            raise
+        # the slot is only free again when the worker is done with it, which may be after a cancellation
+        future.add_done_callback(lambda _: self._releaseFrom(loop, slot))
+        try:
+            solution, stats = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            self.flags[slot] = 1
+            future.cancel()
+            raise
+        if solution is not None:
+            stats.solution = {graph.variables[i]: value for i, value in solution}
+        return stats
+
+    def _releaseFrom(self, loop: asyncio.AbstractEventLoop, slot: int):
+        """ Releases slot on loop, from the thread that finished its future. """
+        try:
+            loop.call_soon_threadsafe(self._release, slot)
+        except RuntimeError:                # the loop is closed, so nobody waits for the slot
+            pass
+
+    def _release(self, slot: int):
+        self.flags[slot] = 0
+        self.free.append(slot)
+        self.slots.release()
@@ -0,0 +1,67 @@
+""" Restart policies for the backtracking search.
+    The run time of a backtracking search with randomized tie-breaking is heavy-tailed: most runs are short, but
+    an early bad choice can cost orders of magnitude more. Restarting the search after a cutoff on the number of
+    search nodes, with the next random tie-breaking, cuts that tail off. The cutoffs grow, so a search that needs
+    many nodes still gets them eventually and stays complete.
+"""
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
+
+def luby(i: int) -> int:
+    """ Returns term i (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ... """
+    while True:
+        k = i.bit_length()
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+class RestartPolicy(ABC):
+    """ Strategy for the cutoffs of the restarts of `search.BacktrackingSearch`. """
+    def __init__(self, unit: int = 100):
+        self.unit = unit
+
+    @abstractmethod
+    def cutoffs(self) -> Iterator[int]:
+        """ Yields the number of nodes of every run of the search, the first run included. """
+        pass
+
+
+class LubyRestarts(RestartPolicy):
+    """ Runs of unit times the Luby sequence: unit, unit, 2 unit, unit, unit, 2 unit, 4 unit, ...
+        Within a constant factor of the optimal restart strategy for any run time distribution (Luby et al.).
+    """
+    def cutoffs(self):
+        i = 1
+        while True:
+            yield self.unit * luby(i)
+            i += 1
+
+
+class GeometricRestarts(RestartPolicy):
+    """ Runs that grow by factor every restart: unit, unit * factor, unit * factor², ... """
+    def __init__(self, unit: int = 100, factor: float = 1.5):
+        super().__init__(unit)
+        self.factor = factor
+
+    def cutoffs(self):
+        cutoff = float(self.unit)
+        while True:
+            yield int(cutoff)
+            cutoff *= self.factor
+
+
+RESTART_POLICIES = {
+    "luby": LubyRestarts,
+    "geometric": GeometricRestarts,
+}
+
+
+def makeRestartPolicy(name: Optional[str], unit: int = 100) -> Optional[RestartPolicy]:
+    """ Returns the restart policy called name (see RESTART_POLICIES) with the given unit, or None for no name. """
+    if name is None:
+        return None
+    if name not in RESTART_POLICIES:
+        raise ValueError(f"Unknown restart policy '{name}'.")
+    return RESTART_POLICIES[name](unit)
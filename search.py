@@ -0,0 +1,249 @@
+""" The backtracking search of the bf, fc and ac3 methods, on an explicit stack.
+    The search never recurses, so its depth is not limited by the Python recursion limit, and it can be
+    paused after a number of nodes and resumed later, or continued after a solution to find the next one.
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from domains import markDomains, undoDomains
+from restarts import RestartPolicy
+from stats import SearchStats
+
+if TYPE_CHECKING:
+    from CSP import CSP, ConsistencyChecker, Variable, Value
+
+
+Nogood = FrozenSet[Tuple['Variable', 'Value']]
+
+
+class NogoodStore:
+    """ A bounded store of nogoods: partial assignments, as sets of (variable, value) pairs, that are proven to have
+        no solution. Every nogood is indexed by each of its pairs, so `NogoodStore::check` only looks at the nogoods
+        that contain the value being tried. Nogoods of more than maxSize pairs are not stored, and when the store is
+        full the least recently used nogood is evicted.
+    """
+    def __init__(self, capacity: int, maxSize: int = 10):
+        self.capacity = capacity
+        self.maxSize = maxSize
+        self.nogoods: 'OrderedDict[Nogood, None]' = OrderedDict()
+        self.index: Dict[Tuple['Variable', 'Value'], Set[Nogood]] = dict()
+
+    def __len__(self) -> int:
+        return len(self.nogoods)
+
+    def add(self, nogood: Nogood):
+        if len(nogood) > self.maxSize or nogood in self.nogoods:
+            return
+        if len(self.nogoods) >= self.capacity:
+            evicted, _ = self.nogoods.popitem(last=False)
+            for pair in evicted:
+                self.index[pair].discard(evicted)
+        self.nogoods[nogood] = None
+        for pair in nogood:
+            self.index.setdefault(pair, set()).add(nogood)
+
+    def check(self, var: 'Variable', value: 'Value', assignment: Dict['Variable', 'Value']) -> Optional[Nogood]:
+        """ Returns a nogood that assigning value to var would complete, or None if there is none. """
+        for nogood in self.index.get((var, value), ()):
+            if all(other is var or assignment.get(other, nogood) == other_value for other, other_value in nogood):
+                self.nogoods.move_to_end(nogood)
+                return nogood
+        return None
+
+
+class BacktrackingSearch:
+    """ Depth first search over the assignments of a CSP, with the propagation of method:
+        "bf" (none), "fc" (forward checking) or "ac3" (forward checking and arc consistency).
+        Every open node of the search has a frame on the stack with its variable, its ordered values,
+        the index of the next value to try, its domains and the undo mark of the value being tried.
+        The assignment, domains and checker are modified in place, like in the recursive search; the solvers pass
+        an `assignment.Assignment`, which keeps the assignment in one array of value ids whatever the depth.
+        The search ends in one of the states:
+        - SOLVED: `BacktrackingSearch::run` returned a solution; running again continues with the next one;
+        - PAUSED: the node budget of the run was used up; running again resumes the search;
+        - STOPPED: the stop condition of the CSP was set;
+        - EXHAUSTED: there are no (more) solutions.
+        With backjumping (for "bf" and "fc"), a node whose values all fail jumps back to the deepest variable of its
+        conflict set instead of the previous one (conflict-directed backjumping). The conflict set of a variable is
+        its assigned neighbors, which are the only variables that check or forward check its values, plus the
+        conflict sets of the nodes that jumped back to it. Arc consistency prunes through chains of unassigned
+        variables, so "ac3" has no such conflict sets and cannot backjump.
+        With nogoods > 0, the assignment of every conflict set is stored as a nogood in a `NogoodStore` of that
+        capacity, and values that would complete a stored nogood are skipped.
+        With a restart policy, the search retracts all its assignments and starts over from the root whenever a
+        run used up its cutoff of nodes. Restarts only pay off with randomized tie-breaking (`CSP::rng`) or a
+        learning variable order, so every run searches differently; nogoods are kept across restarts.
+        Restarts are meant for finding a solution: a search continued after one may find the same one again.
+    """
+    RUNNING, SOLVED, PAUSED, STOPPED, EXHAUSTED = "running", "solved", "paused", "stopped", "exhausted"
+
+    def __init__(self, csp: 'CSP', method: str, assignment: Dict['Variable', 'Value'], domains,
+                 arcConsistency: Optional[Callable] = None, checker: Optional['ConsistencyChecker'] = None,
+                 stats: Optional[SearchStats] = None, backjumping: bool = False, nogoods: int = 0,
+                 restarts: Optional[RestartPolicy] = None):
+        if method not in ("bf", "fc", "ac3"):
+            raise ValueError(f"Method '{method}' not found.")
+        if method == "ac3" and (backjumping or nogoods):
+            raise ValueError("Backjumping and nogoods need the conflict sets of bf or fc, not ac3.")
+        self.csp = csp
+        self.method = method
+        self.assignment = assignment
+        self.arcConsistency = (arcConsistency or csp.ac3) if method == "ac3" else None
+        self.checker = checker if checker is not None else csp.consistencyChecker(assignment)
+        self.stats = stats if stats is not None else csp.stats if csp.stats is not None else SearchStats()
+        self.status = self.RUNNING
+        self.stack: List[list] = []
+        self.domains = domains          # the domains of the node to expand next, None if there is none
+        self.initialSize = len(assignment)
+        self.backjumping = backjumping or nogoods > 0
+        self.nogoods = NogoodStore(nogoods) if nogoods > 0 else None
+        self.solvedDepth = 0            # the frames below this depth have a solution below them
+        self.rootDomains = domains
+        self.cutoffs = restarts.cutoffs() if restarts is not None else None
+        self.restartAt: Optional[int] = None    # the node count at which the search restarts next
+
+    @property
+    def depth(self) -> int:
+        """ Returns the number of variables the search has assigned. """
+        return len(self.assignment) - self.initialSize
+
+    def run(self, maxNodes: Optional[int] = None) -> Optional[Dict['Variable', 'Value']]:
+        """ Runs the search until it finds a solution, expanded maxNodes more nodes (if given), or ends.
+            The time of the run is added to the stats.
+            :return: the (live) assignment if it is a solution, None otherwise (see `BacktrackingSearch::status`).
+        """
+        with self.stats.measure(self.initialSize):
+            return self._run(maxNodes)
+
+    def _run(self, maxNodes: Optional[int] = None) -> Optional[Dict['Variable', 'Value']]:
+        """ `BacktrackingSearch::run` without measuring the time, for searches that are measured by the caller. """
+        csp, stats, assignment, checker, stack = self.csp, self.stats, self.assignment, self.checker, self.stack
+        method, arcConsistency, backjumping, nogoods = self.method, self.arcConsistency, self.backjumping, self.nogoods
+        variableOrder, stopCondition, isComplete = csp.variableOrder, csp.stopCondition, csp.isComplete
+        timing = stats.timing
+        initialSize = self.initialSize
+        stats.initialSize = initialSize
+        limit = stats.nodes + maxNodes if maxNodes is not None else None
+        csp.stats = stats
+        self.status = self.RUNNING
+        domains = self.domains
+        if self.cutoffs is not None and self.restartAt is None:
+            self.restartAt = stats.nodes + next(self.cutoffs)
+        restartAt = self.restartAt
+
+        while True:
+            if domains is not None:
+                # expand the node of the current assignment
+                if restartAt is not None and stats.nodes >= restartAt:
+                    if stack: domains = self._restart()
+                    restartAt = self.restartAt = stats.nodes + next(self.cutoffs)
+                if limit is not None and stats.nodes >= limit:
+                    self.domains = domains
+                    self.status = self.PAUSED
+                    return None
+                stats.nodes += 1
+                if stats.nodes == stats.nextSample: stats.sampled()
+                depth = len(assignment) - initialSize
+                if depth > stats.maxDepth: stats.maxDepth = depth
+                if isComplete(assignment):
+                    self.domains = None
+                    self.solvedDepth = len(stack)
+                    self.status = self.SOLVED
+                    return assignment
+                if stopCondition is not None and stopCondition():
+                    self.domains = domains
+                    self.status = self.STOPPED
+                    return None
+                if timing: start = time.perf_counter()
+                var = csp.selectVariable(assignment, domains)
+                values = csp.orderDomain(assignment, domains, var)
+                if timing: stats.heuristicTime += time.perf_counter() - start
+                stack.append([var, values, 0, domains, None, False, None])
+                domains = None
+
+            if not stack:
+                self.domains = None
+                self.status = self.EXHAUSTED
+                return None
+
+            # retract the value tried last at the top node, and try its next consistent value
+            frame = stack[-1]
+            var, values, k, node_domains, mark, assigned, _ = frame
+            if assigned:
+                undoDomains(node_domains, mark)
+                checker.unassign(var, values[k - 1])
+                assignment.pop(var)
+                frame[5] = False
+            while k < len(values):
+                value = values[k]
+                k += 1
+                if checker.isConsistent(var, value):
+                    if nogoods is not None:
+                        nogood = nogoods.check(var, value, assignment)
+                        if nogood is not None:
+                            stats.nogoodHits += 1
+                            frame[6] = (frame[6] or set()).union(other for other, _ in nogood if other is not var)
+                            continue
+                    assignment[var] = value
+                    checker.assign(var, value)
+                    frame[2], frame[4], frame[5] = k, markDomains(node_domains), True
+                    domains = node_domains
+                    if method != "bf":
+                        if timing: start = time.perf_counter()
+                        domains = csp.forwardChecking(assignment, domains, var)
+                        if timing: stats.propagationTime += time.perf_counter() - start
+                        variableOrder.propagated(csp, assignment, domains, var)
+                        if method == "ac3":
+                            if timing: start = time.perf_counter()
+                            domains = arcConsistency(assignment, domains)
+                            if timing: stats.propagationTime += time.perf_counter() - start
+                    break
+            else:
+                stack.pop()
+                stats.backtracks += 1
+                if backjumping:
+                    self._backjump(frame)
+
+    def _restart(self):
+        """ Retracts every assignment of the search, back to the root node, and returns the domains of the root. """
+        stack, assignment, checker = self.stack, self.assignment, self.checker
+        while stack:
+            var, values, k, domains, mark = stack.pop()[:5]
+            undoDomains(domains, mark)
+            checker.unassign(var, values[k - 1])
+            assignment.pop(var)
+        self.solvedDepth = 0
+        self.stats.restarts += 1
+        return self.rootDomains
+
+    def _backjump(self, frame: list):
+        """ Called when all values of the node of frame (just popped off the stack) failed: retracts the
+            assignments of the nodes above the deepest variable of its conflict set, which is tried with its
+            next value next, and adds the conflict set to that of the variable.
+            The nodes that have a solution below them were not failed by their conflict sets, so they backtrack
+            chronologically.
+        """
+        stack, assignment = self.stack, self.assignment
+        depth = len(stack)
+        if depth < self.solvedDepth:
+            self.solvedDepth = depth
+            return
+        graph = self.csp.graph
+        level = {f[0]: i for i, f in enumerate(stack)}
+        var, conflicts = frame[0], frame[6] or set()
+        conflicts.update(neighbor for neighbor in graph.neighborVars[graph.index[var]] if neighbor in level)
+        if self.nogoods is not None:
+            self.nogoods.add(frozenset((other, assignment[other]) for other in conflicts))
+        target = max((level[other] for other in conflicts), default=-1)
+        checker, stats = self.checker, self.stats
+        while len(stack) > target + 1:
+            other, values, k, domains, mark = stack.pop()[:5]
+            undoDomains(domains, mark)
+            checker.unassign(other, values[k - 1])
+            assignment.pop(other)
+            stats.backjumps += 1
+        if stack:
+            target_frame = stack[-1]
+            conflicts.discard(target_frame[0])
+            target_frame[6] = conflicts if target_frame[6] is None else target_frame[6] | conflicts
@@ -0,0 +1,168 @@
+""" A long-lived solver that answers newline-delimited JSON requests, on stdin/stdout or on a Unix socket.
+    Every request is one JSON object on a line, e.g.
+
+        {"id": 1, "problem": "queens:50", "method": "fc", "options": {"bitset": true}}
+        {"id": 2, "problem": "sudoku", "puzzle": "0030206009003050010018064...", "method": "ac3"}
+        {"id": 3, "problem": "sudoku:puzzles/hard.txt", "method": "fc", "count": true}
+
+    and is answered by one JSON object on a line with the same id, the status, the solution (or the number of
+    solutions) and the statistics of the solve, or an error. The problems are "queens:<n>", "sudoku:<path>" with
+    the path of a puzzle file under puzzles/ (from the repository, see `puzzlePath`) and "sudoku" with the puzzle
+    as a line. The options are those of `CSP::solve`.
+    The CSP of every problem structure (a board size) is built once, with its compiled constraint graph, and
+    reused by the requests that follow, so a request only pays for parsing its puzzle and the search itself.
+    N Queens builds its graph on first use instead, since min-conflicts and dlx never need it. Requests run one
+    at a time, so the board sizes are bounded: up to MAX_QUEENS queens for min-conflicts, MAX_SEARCH_QUEENS for
+    the other methods, and Sudoku boxes of up to MAX_SUDOKU × MAX_SUDOKU cells.
+"""
+import io
+import json
+import os
+import socketserver
+import stat
+import threading
+from math import isqrt
+from typing import Dict, Iterable, TextIO, Tuple
+
+from CSP import CSP, Variable, Value
+from NQueens import NQueens
+from stats import SearchStats
+from Sudoku import Sudoku, readGrid
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PUZZLES = os.path.realpath(os.path.join(ROOT, "puzzles"))
+MAX_QUEENS = 100000
+MAX_SEARCH_QUEENS = 1000
+MAX_SUDOKU = 5
+
+
+class SolverServer:
+    """ Answers solve requests (see the module) with warm CSPs, keyed by problem structure. """
+    def __init__(self):
+        self.problems: Dict[Tuple, CSP] = dict()
+        self.lock = threading.Lock()        # the CSPs are shared by the connections of a socket
+        self.requests = 0
+
+    def warm(self, key: Tuple, build, graph: bool = True) -> CSP:
+        """ Returns the CSP for key, building it (and its constraint graph, if graph is set) with build on first use. """
+        csp = self.problems.get(key)
+        if csp is None:
+            csp = self.problems[key] = build()
+            if graph: csp.graph
+        return csp
+
+    def problem(self, request: Dict) -> Tuple[CSP, Dict[Variable, Value]]:
+        """ Returns the warm CSP and the initial assignment of a request. """
+        kind, _, argument = request["problem"].partition(":")
+        if kind == "queens":
+            n = int(argument)
+            limit = MAX_QUEENS if request.get("method", "fc") == "minconflicts" else MAX_SEARCH_QUEENS
+            if not 1 <= n <= limit:
+                raise ValueError(f"queens:<n> takes 1 to {limit} queens with method {request.get('method', 'fc')}.")
+            symmetry = bool(request.get("symmetry", False))
+            return self.warm(("queens", n, symmetry), lambda: NQueens(n, symmetry), graph=False), dict()
+        if kind == "sudoku":
+            if argument:
+                rows = readGrid(puzzlePath(argument))
+                n = sudokuSize(len(rows) ** 2)
+                csp = self.warm(("sudoku", n), lambda: Sudoku(n))
+                return csp, csp._gridAssignment(rows)
+            puzzle = request["puzzle"].strip()
+            n = sudokuSize(len(puzzle))
+            csp = self.warm(("sudoku", n), lambda: Sudoku(n))
+            return csp, csp.parseLine(puzzle)
+        raise ValueError(f"Unknown problem '{request['problem']}', expected 'queens:<n>', 'sudoku:<path>' or 'sudoku'.")
+
+    def handle(self, request: Dict) -> Dict:
+        """ Solves one request and returns its response. Errors are reported in the response. """
+        response = {"id": request.get("id")}
+        try:
+            with self.lock:
+                self.requests += 1
+                csp, assignment = self.problem(request)
+                method = request.get("method", "fc")
+                options = dict(request.get("options", dict()))
+                csp.useStrategies("mrv", "lcv")         # no strategy state leaks from the previous request
+                if request.get("count", False):
+                    stats = options["stats"] = SearchStats()
+                    response["count"] = csp.countSolutions(method, assignment, **options)
+                else:
+                    stats = csp.solve(method, assignment, **options)
+                    response["solution"] = formatSolution(csp, stats.solution)
+        except Exception as error:
+            response["error"] = f"{type(error).__name__}: {error}"
+            return response
+        if stats.status is not None: response["status"] = stats.status
+        response["stats"] = stats.asDict()
+        return response
+
+    def serveLines(self, lines: Iterable[str], output: TextIO):
+        """ Answers every request line of lines on output, flushing after every response. """
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                response = {"id": None, "error": f"Invalid request: {error}"}
+            else:
+                response = self.handle(request) if isinstance(request, dict) else \
+                    {"id": None, "error": "Invalid request: expected a JSON object"}
+            output.write(json.dumps(response) + "\n")
+            output.flush()
+
+    def serveSocket(self, path: str):
+        """ Serves the connections to a Unix socket at path until interrupted, one thread per connection.
+            Solves are serialized, since the connections share the warm CSPs. A socket left at path by a previous
+            server is replaced, any other file is not.
+        """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serveLines(io.TextIOWrapper(self.rfile), io.TextIOWrapper(self.wfile, write_through=True))
+
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise ValueError(f"{path} exists and is not a socket.")
+            os.unlink(path)                 # left behind by a previous server
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as socket_server:
+            try:
+                socket_server.serve_forever()
+            finally:
+                os.unlink(path)
+
+
+def puzzlePath(argument: str) -> str:
+    """ Returns the path of the puzzle file argument, relative to the repository (e.g. "puzzles/hard.txt").
+        Clients only get to read the puzzle files: paths outside puzzles/ are refused.
+    """
+    path = os.path.realpath(os.path.join(ROOT, argument))
+    if os.path.commonpath([path, PUZZLES]) != PUZZLES or not os.path.isfile(path):
+        raise ValueError(f"No puzzle file '{argument}' in puzzles/.")
+    return path
+
+
+def sudokuSize(cells: int) -> int:
+    """ Returns the box size n of a Sudoku of cells cells ((n²)²), checked before its CSP is built. """
+    n = isqrt(isqrt(cells))
+    if not 2 <= n <= MAX_SUDOKU or (n * n) ** 2 != cells:
+        raise ValueError(f"A sudoku needs (n²)² cells for n from 2 to {MAX_SUDOKU}, not {cells}.")
+    return n
+
+
+def formatSolution(csp: CSP, solution):
+    """ Returns solution in the JSON form of the problem: a line for a Sudoku, the row of the queen of every
+        column for N Queens, and None if there is no solution.
+    """
+    if solution is None:
+        return None
+    if isinstance(csp, Sudoku):
+        return csp.assignmentToLine(solution)
+    if isinstance(csp, NQueens):
+        return [solution[queen] for queen in csp.queens]
+    return csp.assignmentToStr(solution)
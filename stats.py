@@ -0,0 +1,172 @@
+""" Statistics of a single solve. """
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pstats
+
+
+# outcomes of a solve, see `SearchStats::status`
+SOLVED = "solved"
+UNSATISFIABLE = "unsatisfiable"
+TIMEOUT = "timeout"
+STOPPED = "stopped"
+UNKNOWN = "unknown"
+
+
+def resetPeakRss() -> bool:
+    """ Resets the peak resident set size of this process to its current size (Linux only).
+        :return: whether it was reset; if not, `peakRss` keeps measuring from the start of the process.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peakRss() -> Optional[int]:
+    """ Returns the peak resident set size of this process in bytes, since the start of the process or the last
+        `resetPeakRss`, or None on platforms that do not report it.
+    """
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class SearchStats:
+    """ Statistics of one solve, returned by the `CSP::solve*` methods with the solution in `solution`.
+        The counters are plain attributes that the search increments directly, so keeping them costs next to nothing:
+        - nodes: search nodes (calls of the recursive search, or steps of a local search);
+        - backtracks: search nodes that failed;
+        - pruned: values removed from domains by forward checking;
+        - revisions: arcs revised by arc consistency;
+        - backjumps: nodes skipped by jumping back over them (see `search.BacktrackingSearch`);
+        - nogoodHits: values skipped because they completed a learned nogood;
+        - restarts: times the backtracking search started over from the root (see `restarts`);
+        - maxDepth: the largest number of variables assigned by the search (not counting the initial assignment).
+        The outcome of the solve is in status: SOLVED, UNSATISFIABLE (the search was exhausted), TIMEOUT (the node
+        budget or the deadline of the solve was used up), STOPPED (by the stop condition of the CSP) or UNKNOWN
+        (a local search that gave up). The counters of a solve that timed out are the work done until then.
+        Everything more expensive is opt-in:
+        - timing: split the time spent in propagation (forward checking and arc consistency) and in the variable
+          and value ordering heuristics, at the cost of two `time.perf_counter` calls per part per node;
+        - profile: run the solve under cProfile, leaving the `pstats.Stats` in `profileStats`;
+        - memory: measure the peak resident set size of the process during the solve in `peakRss`, in bytes, to size
+          pools of workers by (on Linux; elsewhere the peak since the start of the process, or None if unknown).
+          This resets the peak of the whole process (see `resetPeakRss`), so it is meant for processes that do
+          nothing but solve, like the workers of a pool;
+        - `SearchStats::sample`: call a function, e.g. a `util.ProgressBar`, every so many nodes.
+    """
+    __slots__ = ('solution', 'status', 'nodes', 'backtracks', 'pruned', 'revisions', 'backjumps', 'nogoodHits', 'restarts', 'maxDepth', 'peakRss', 'time', 'propagationTime',
+                 'heuristicTime', 'cached', 'timing', 'profile', 'memory', 'profileStats', 'initialSize', 'nextSample', 'sampleEvery',
+                 'sampler')
+
+    def __init__(self, timing: bool = False, profile: bool = False, memory: bool = False):
+        self.solution: Optional[Dict] = None
+        self.status: Optional[str] = None
+        self.nodes = 0
+        self.backtracks = 0
+        self.pruned = 0
+        self.revisions = 0
+        self.backjumps = 0
+        self.nogoodHits = 0
+        self.restarts = 0
+        self.maxDepth = 0
+        self.peakRss: Optional[int] = None
+        self.time = 0.0
+        self.propagationTime = 0.0
+        self.heuristicTime = 0.0
+        self.cached = False             # whether the solution came from a `cache.SolutionCache`
+        self.timing = timing
+        self.profile = profile
+        self.memory = memory
+        self.profileStats: Optional['pstats.Stats'] = None
+        self.initialSize = 0            # size of the initial assignment, subtracted from the depth
+        self.nextSample = 0             # node count of the next sample, 0 if sampling is off
+        self.sampleEvery = 0
+        self.sampler: Optional[Callable[['SearchStats'], None]] = None
+
+    @property
+    def solved(self) -> bool:
+        return self.solution is not None
+
+    def sample(self, every: int, sampler: Callable[['SearchStats'], None]) -> 'SearchStats':
+        """ Calls sampler with these stats every `every` search nodes, and once when the solve ends. """
+        self.sampleEvery, self.sampler = every, sampler
+        self.nextSample = self.nodes + every
+        return self
+
+    def sampled(self):
+        """ Called by the search when nodes reaches nextSample. """
+        self.nextSample += self.sampleEvery
+        self.sampler(self)
+
+    @contextmanager
+    def measure(self, initialSize: int = 0):
+        """ Times (and profiles, and measures the peak RSS of, if requested) the solve running in this context. """
+        self.initialSize = initialSize
+        profiler = None
+        if self.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+        if self.memory: resetPeakRss()
+        start = time.perf_counter()
+        if profiler is not None: profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                import io
+                import pstats
+                self.profileStats = pstats.Stats(profiler, stream=io.StringIO())
+            self.time += time.perf_counter() - start
+            if self.memory:
+                rss = peakRss()
+                if rss is not None and (self.peakRss is None or rss > self.peakRss): self.peakRss = rss
+            if self.sampler is not None:
+                self.sampler(self)
+
+    def merge(self, other: 'SearchStats'):
+        """ Adds the counters and times of other (e.g. the stats of a subproblem) to these stats. """
+        self.nodes += other.nodes
+        self.backtracks += other.backtracks
+        self.pruned += other.pruned
+        self.revisions += other.revisions
+        self.backjumps += other.backjumps
+        self.nogoodHits += other.nogoodHits
+        self.restarts += other.restarts
+        self.maxDepth = max(self.maxDepth, other.maxDepth)
+        if other.peakRss is not None and (self.peakRss is None or other.peakRss > self.peakRss):
+            self.peakRss = other.peakRss
+        self.propagationTime += other.propagationTime
+        self.heuristicTime += other.heuristicTime
+
+    def asDict(self) -> Dict:
+        """ Returns the statistics (without the solution) as a JSON serializable dict. """
+        stats = {name: getattr(self, name) for name in ('status', 'nodes', 'backtracks', 'pruned', 'revisions', 'backjumps', 'nogoodHits',
+                                                   'restarts', 'maxDepth', 'time')}
+        if self.timing:
+            stats.update(propagationTime=self.propagationTime, heuristicTime=self.heuristicTime)
+        if self.memory:
+            stats.update(peakRss=self.peakRss)
+        return stats
+
+    def __repr__(self):
+        return "SearchStats(" + ", ".join(f"{name}={value:.4g}" if isinstance(value, float) else
+                                          f"{name}={value!r}" if isinstance(value, str) else f"{name}={value}"
+                                          for name, value in self.asDict().items()) + ")"
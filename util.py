@@ -1,15 +1,19 @@
 from tqdm import tqdm
 
 
-progressBars = dict()
-
-
-def monitor(f):
-    """ Decorator to time functions and count the amount of calls. """
-    def wrapper(*args, **kwargs):
-        if f not in progressBars:
-            progressBars[f] = tqdm(desc=f.__name__, unit=" calls")
-        progress = progressBars[f]
-        progress.update(1)
-        return f(*args, **kwargs)
-    return wrapper
+class ProgressBar:
+    """ Shows the search nodes of a solve in a tqdm progress bar.
+        Opt-in consumer of `SearchStats`: pass it to `SearchStats::sample`.
+    """
+    def __init__(self, desc: str = "search"):
+        self.desc = desc
+        self.bar = None
+
+    def __call__(self, stats):
+        if self.bar is None:
+            self.bar = tqdm(desc=self.desc, unit=" nodes")
+        self.bar.update(stats.nodes - self.bar.n)
+
+    def close(self):
+        if self.bar is not None:
+            self.bar.close()